@@ -0,0 +1,100 @@
+# analytics.py
+from datetime import date as Date
+
+import numpy as np
+
+import attendance
+
+
+# === АНАЛИТИКА ПОСЕЩАЕМОСТИ ===
+# Период загружается одним снимком базы в матрицу ученики × учебные дни
+# (True — отсутствовал) и считается целиком операциями NumPy:
+# доля посещений, самая длинная серия пропусков, пропуски по дням недели
+# и список учеников с долей пропусков не ниже порога.
+# Наложение как в attendance.build_matrix: интервалы, архив, разовые отметки.
+
+CHRONIC_THRESHOLD = 0.1  # 10% пропусков и больше — хронические пропуски
+
+class Term:
+    def __init__(self, dates: list, students: list, absent: np.ndarray):
+        self.dates = dates
+        self.students = students  # [(user_id, name)] по алфавиту
+        self.absent = absent      # bool[учеников, дней]
+        self.weekdays = np.array([Date.fromisoformat(d).weekday() for d in dates], dtype=np.int8)
+
+    def attendance_rates(self) -> np.ndarray:
+        if not self.dates:
+            return np.ones(len(self.students))
+        return 1.0 - self.absent.mean(axis=1)
+
+    def longest_streaks(self) -> np.ndarray:
+        # Начала и концы серий True находятся по разности с нулевыми краями
+        rows = len(self.students)
+        padded = np.zeros((rows, len(self.dates) + 2), dtype=np.int8)
+        padded[:, 1:-1] = self.absent
+        edges = np.diff(padded, axis=1)
+        start_rows, start_cols = np.nonzero(edges == 1)
+        _, end_cols = np.nonzero(edges == -1)
+        streaks = np.zeros(rows, dtype=np.int64)
+        np.maximum.at(streaks, start_rows, end_cols - start_cols)
+        return streaks
+
+    def weekday_absence(self) -> np.ndarray:
+        # Доля пропусков по дням недели (пн..вс) для всего класса
+        per_day = self.absent.sum(axis=0)
+        totals = np.bincount(self.weekdays, weights=per_day, minlength=7)
+        days = np.bincount(self.weekdays, minlength=7) * max(len(self.students), 1)
+        return np.divide(totals, days, out=np.zeros(7), where=days > 0)
+
+    def chronic(self, threshold: float = CHRONIC_THRESHOLD) -> list:
+        rates = 1.0 - self.attendance_rates()
+        order = np.argsort(-rates, kind="stable")
+        return [(self.students[i][1], float(rates[i])) for i in order if rates[i] >= threshold]
+
+
+def build_term(dates: list, students, intervals, marks, archived) -> Term:
+    index = {user_id: row for row, (user_id, _) in enumerate(students)}
+    absent = np.zeros((len(students), len(dates)), dtype=bool)
+    if not students or not dates:
+        return Term(dates, students, absent)
+    day_keys = np.array(dates)
+
+    for user_id, start, end, _ in intervals:
+        row = index.get(user_id)
+        if row is None:
+            continue
+        lo = np.searchsorted(day_keys, start, side="left")
+        hi = len(dates) if end is None else np.searchsorted(day_keys, end, side="right")
+        absent[row, lo:hi] = True
+
+    archive_rows, _ = archived
+    if archive_rows:
+        months = day_keys.astype("U7")
+        day_bits = np.array([int(d[8:10]) - 1 for d in dates], dtype=np.int64)
+        by_month = {}
+        for user_id, month, mask in archive_rows:
+            if user_id in index:
+                by_month.setdefault(month, []).append((index[user_id], mask))
+        for month, entries in by_month.items():
+            cols = np.nonzero(months == month)[0]
+            if not len(cols):
+                continue
+            rows = np.array([row for row, _ in entries])
+            masks = np.array([mask for _, mask in entries], dtype=np.int64)
+            present = (masks[:, None] >> day_bits[cols][None, :]) & 1
+            absent[rows[:, None], cols[None, :]] = present == 0
+
+    # Отметки за выходные и другие не учебные дни в матрицу не попадают
+    column = {date: col for col, date in enumerate(dates)}
+    cells = [
+        (index[user_id], column[date], status != "present")
+        for user_id, date, status, _ in marks if user_id in index and date in column
+    ]
+    if cells:
+        rows, cols, values = map(np.array, zip(*cells))
+        absent[rows, cols] = values
+
+    return Term(dates, students, absent)
+
+async def load_term(db, dates: list) -> Term:
+    return build_term(dates, *await db.snapshot(attendance.read_matrix_rows, dates))
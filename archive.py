@@ -0,0 +1,82 @@
+# archive.py
+import calendar
+
+
+# === АРХИВ ПОСЕЩАЕМОСТИ ПО МЕСЯЦАМ ===
+# Закрытый месяц хранится одной строкой на ученика, у которого в этом
+# месяце были отсутствия: битовая маска присутствия (бит d-1 — день d
+# месяца) и диапазоны дней отсутствия с одной причиной (не выходят за
+# месяц). Ученик без строки в архиве весь месяц присутствовал.
+# Свёртку месяцев выполняет attendance.compact, чтение — attendance.*
+# прозрачно объединяет архив с живыми строками.
+
+def month_dates(month: str) -> list:
+    year, number = int(month[:4]), int(month[5:7])
+    days = calendar.monthrange(year, number)[1]
+    return [f"{month}-{day:02d}" for day in range(1, days + 1)]
+
+def next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12}-{number % 12 + 1:02d}"
+
+def pack(cells, dates: list):
+    # cells — [(status, reason)] по дням месяца → (маска, [(start, end, reason)])
+    mask = 0
+    ranges = []
+    for bit, (date, (status, reason)) in enumerate(zip(dates, cells)):
+        if status == "present":
+            mask |= 1 << bit
+        elif not reason:
+            continue
+        elif ranges and ranges[-1][1] == dates[bit - 1] and ranges[-1][2] == reason:
+            ranges[-1][1] = date  # продолжение вчерашнего диапазона с той же причиной
+        else:
+            ranges.append([date, date, reason])
+    return mask, [tuple(item) for item in ranges]
+
+def full_mask(dates: list) -> int:
+    return (1 << len(dates)) - 1
+
+def store(conn, user_id: int, month: str, mask: int, ranges: list):
+    conn.execute(
+        "INSERT OR REPLACE INTO attendance_archive (user_id, month, present) VALUES (?, ?, ?)",
+        (user_id, month, mask)
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO attendance_archive_absences (user_id, start_date, end_date, reason) VALUES (?, ?, ?, ?)",
+        [(user_id, start, end, reason) for start, end, reason in ranges]
+    )
+
+# --- Чтение ---
+def read_range(conn, first: str, last: str):
+    rows = conn.execute(
+        "SELECT user_id, month, present FROM attendance_archive WHERE month BETWEEN ? AND ?",
+        (first[:7], last[:7])
+    ).fetchall()
+    # Диапазон не выходит за месяц, поэтому начинается не раньше первого числа месяца first
+    ranges = conn.execute(
+        "SELECT user_id, start_date, end_date, reason FROM attendance_archive_absences "
+        "WHERE start_date BETWEEN ? AND ? AND end_date >= ?",
+        (first[:7] + "-01", last, first)
+    ).fetchall() if rows else []
+    return rows, ranges
+
+def expand(rows, ranges, dates: list) -> dict:
+    # {user_id: {date: (status, reason)}} для тех дат, что попали в архив
+    by_month = {}
+    for date in dates:
+        by_month.setdefault(date[:7], []).append(date)
+    reason_of = {}
+    for user_id, start, end, reason in ranges:
+        for date in by_month.get(start[:7], ()):
+            if start <= date <= end:
+                reason_of[(user_id, date)] = reason
+    result = {}
+    for user_id, month, mask in rows:
+        days = result.setdefault(user_id, {})
+        for date in by_month.get(month, ()):
+            if mask >> (int(date[8:10]) - 1) & 1:
+                days[date] = ("present", None)
+            else:
+                days[date] = ("absent", reason_of.get((user_id, date)))
+    return result
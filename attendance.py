@@ -0,0 +1,158 @@
+# attendance.py
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+import archive
+
+
+# === ОТСУТСТВИЯ ИНТЕРВАЛАМИ ===
+# «❌ Не приду» хранится одной строкой в таблице absences:
+# (start_date, end_date или NULL — «до отмены», reason).
+# Интервалы одного ученика не пересекаются.
+# Строки attendance остаются разовыми отметками на конкретный день
+# и имеют приоритет над интервалами.
+
+def previous_day(date: str) -> str:
+    return (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+
+def close_absences(conn, user_id: int, start_date: str):
+    # Обрезает все отсутствия ученика так, чтобы они закончились до start_date
+    conn.execute("DELETE FROM absences WHERE user_id=? AND start_date>=?", (user_id, start_date))
+    conn.execute(
+        "UPDATE absences SET end_date=? WHERE user_id=? AND start_date<? AND (end_date IS NULL OR end_date>=?)",
+        (previous_day(start_date), user_id, start_date, start_date)
+    )
+    conn.execute("DELETE FROM attendance WHERE user_id=? AND date>=?", (user_id, start_date))
+
+def open_absence(conn, user_id: int, start_date: str, reason: str, end_date: str = None):
+    close_absences(conn, user_id, start_date)
+    conn.execute(
+        "INSERT INTO absences (user_id, start_date, end_date, reason) VALUES (?, ?, ?, ?)",
+        (user_id, start_date, end_date, reason)
+    )
+
+async def set_absent_from(db, user_id: int, start_date: str, reason: str, end_date: str = None):
+    await db.transaction(open_absence, user_id, start_date, reason, end_date)
+
+async def clear_absent_from(db, user_id: int, start_date: str):
+    await db.transaction(close_absences, user_id, start_date)
+
+# === Состав класса со статусом на день ===
+# Один LEFT JOIN пользователей с отметками и интервалами на нужную дату.
+ROSTER_STATUS_SQL = '''
+    SELECT u.user_id, u.name,
+        CASE WHEN a.status IS NOT NULL THEN a.status
+             WHEN ab.id IS NOT NULL THEN 'absent'
+             ELSE 'present' END,
+        CASE WHEN a.status IS NOT NULL THEN a.reason ELSE ab.reason END
+    FROM users u
+    LEFT JOIN attendance a ON a.user_id = u.user_id AND a.date = ?
+    LEFT JOIN absences ab ON ab.user_id = u.user_id AND ab.start_date <= ?
+        AND (ab.end_date IS NULL OR ab.end_date >= ?)
+    WHERE u.role = 'student' AND u.approved = 1 {where}
+    ORDER BY u.name ASC
+'''
+
+async def roster_with_status(db, date: str, name: str = None):
+    # [(user_id, name, status, reason)] для одобренных учеников (или одного по имени)
+    if name is None:
+        return await db.fetchall(ROSTER_STATUS_SQL.format(where=""), (date, date, date))
+    return await db.fetchall(ROSTER_STATUS_SQL.format(where="AND u.name = ?"), (date, date, date, name))
+
+# === Матрица посещаемости (ученики × дни) ===
+# Весь период читается из одного снимка базы тремя запросами по диапазону
+# и раскладывается в памяти. Отчёты берут ячейки из матрицы, не обращаясь к базе.
+
+class AttendanceMatrix:
+    def __init__(self, dates: list, students: list):
+        self.dates = dates
+        self.students = students  # [(user_id, name)] по алфавиту
+        self.index = {date: i for i, date in enumerate(dates)}
+        self.cells = {user_id: [("present", None)] * len(dates) for user_id, _ in students}
+
+    def row(self, user_id: int):
+        return self.cells[user_id]
+
+    def column(self, date: str):
+        i = self.index[date]
+        return [(user_id, name, *self.cells[user_id][i]) for user_id, name in self.students]
+
+    def _fill(self, user_id: int, start: str, end: str, value):
+        cells = self.cells.get(user_id)
+        if cells is None:
+            return
+        lo = bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect_right(self.dates, end)
+        for i in range(lo, hi):
+            cells[i] = value
+
+    def _mark(self, user_id: int, date: str, value):
+        cells = self.cells.get(user_id)
+        if cells is not None and date in self.index:
+            cells[self.index[date]] = value
+
+def read_matrix_rows(conn, dates: list):
+    students = conn.execute(
+        "SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC"
+    ).fetchall()
+    if not dates:
+        # Например, месяц целиком на каникулах
+        return students, [], [], ((), ())
+    first, last = dates[0], dates[-1]
+    intervals = conn.execute(
+        "SELECT user_id, start_date, end_date, reason FROM absences WHERE start_date<=? AND (end_date IS NULL OR end_date>=?)",
+        (last, first)
+    ).fetchall()
+    marks = conn.execute(
+        "SELECT user_id, date, status, reason FROM attendance WHERE date BETWEEN ? AND ?",
+        (first, last)
+    ).fetchall()
+    archived = archive.read_range(conn, first, last)
+    return students, intervals, marks, archived
+
+def build_matrix(dates: list, students, intervals, marks, archived=((), ())) -> AttendanceMatrix:
+    # Порядок наложения: интервалы, затем архив закрытых месяцев, затем разовые отметки
+    matrix = AttendanceMatrix(dates, students)
+    for user_id, start, end, reason in intervals:
+        matrix._fill(user_id, start, end, ("absent", reason))
+    for user_id, days in archive.expand(*archived, dates).items():
+        for date, value in days.items():
+            matrix._mark(user_id, date, value)
+    for user_id, date, status, reason in marks:
+        matrix._mark(user_id, date, (status, reason))
+    return matrix
+
+async def month_matrix(db, dates: list) -> AttendanceMatrix:
+    return build_matrix(dates, *await db.snapshot(read_matrix_rows, dates))
+
+# === Свёртка закрытых месяцев в архив ===
+# Месяцы до before ("YYYY-MM-01") раскладываются в итоговые статусы
+# и сохраняются в архив; разовые отметки этих месяцев и интервалы,
+# закончившиеся до before, удаляются. Граница хранится в settings.
+
+def compact(conn, before: str) -> int:
+    row = conn.execute("SELECT value FROM settings WHERE key='archived_before'").fetchone()
+    done = row[0] if row else ""
+    if done >= before:
+        return 0
+    oldest = [
+        conn.execute("SELECT MIN(date) FROM attendance").fetchone()[0],
+        conn.execute("SELECT MIN(start_date) FROM absences").fetchone()[0],
+    ]
+    oldest = [date for date in oldest if date]
+    folded = 0
+    if oldest:
+        month = max(min(oldest), done)[:7]
+        while month < before[:7]:
+            dates = archive.month_dates(month)
+            matrix = build_matrix(dates, *read_matrix_rows(conn, dates))
+            for user_id, _ in matrix.students:
+                mask, ranges = archive.pack(matrix.row(user_id), dates)
+                if mask != archive.full_mask(dates):  # весь месяц присутствовал — строка не нужна
+                    archive.store(conn, user_id, month, mask, ranges)
+            folded += 1
+            month = archive.next_month(month)
+    conn.execute("DELETE FROM attendance WHERE date < ?", (before,))
+    conn.execute("DELETE FROM absences WHERE end_date < ?", (before,))
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('archived_before', ?)", (before,))
+    return folded
@@ -0,0 +1,267 @@
+# bench.py
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, GetMe, SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import sender as send_queue
+from db import Database
+
+
+# === НАГРУЗОЧНЫЙ ТЕСТ ОБРАБОТЧИКОВ ===
+# Бот работает как обычно (dp.feed_update, базы, outbox), но вместо Telegram —
+# поддельный Bot API в том же процессе, без сети и лимитов.
+# Для классов на 30, 300 и 3000 учеников прогоняются типичные наборы обновлений:
+# утренний поток «✅ Приду», /attendance, повтор назначения дежурного
+# и удаление всех учеников. Для каждого сценария выводятся p50/p99 задержки,
+# число SQL-операторов на обновление и пропускная способность.
+# Результаты сравниваются с bench_baseline.json; регрессия — код выхода 1.
+# Запуск: python bench.py [--sizes 30 300] [--rounds 3] [--update-baseline]
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+LATENCY_TOLERANCE = 0.5   # p99 может вырасти на 50% (шум машины)
+LATENCY_SLACK_MS = 5      # и ещё на 5 мс, чтобы быстрые сценарии не «мигали»
+SQL_TOLERANCE = 0.1       # SQL на обновление — на 10%
+THROUGHPUT_TOLERANCE = 0.5  # время прогона целиком (с фоновыми задачами) — на 50% и LATENCY_SLACK_MS
+BATCH = 100               # столько обновлений Telegram отдаёт за один getUpdates
+REPEATS = 20
+
+class FakeBotAPI(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self._ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, (SendMessage, EditMessageText)):
+            chat_id = method.chat_id if isinstance(method.chat_id, int) else -1
+            return Message(message_id=next(self._ids), date=datetime.now(),
+                           chat=Chat(id=chat_id, type="private"), text=method.text)
+        if isinstance(method, GetMe):
+            return User(id=1, is_bot=True, first_name="bench")
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+
+class SqlCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, statement: str):
+        with self._lock:
+            self.count += 1
+
+
+# --- Обновления ---
+_update_ids = itertools.count(1)
+
+def message(user_id: int, text: str) -> Update:
+    return Update(update_id=next(_update_ids), message=Message(
+        message_id=next(_update_ids), date=datetime.now(), text=text,
+        chat=Chat(id=user_id, type="private"), from_user=User(id=user_id, is_bot=False, first_name="u"),
+    ))
+
+def callback(user_id: int, data: str) -> Update:
+    return Update(update_id=next(_update_ids), callback_query=CallbackQuery(
+        id=str(next(_update_ids)), chat_instance="bench", data=data,
+        from_user=User(id=user_id, is_bot=False, first_name="u"),
+        message=Message(message_id=1, date=datetime.now(), text="bench", chat=Chat(id=user_id, type="private")),
+    ))
+
+
+# --- Синтетический класс ---
+def build_class(bot_main, size: int, directory: str, round_no: int = 0):
+    from tenants import Tenant
+    from workdays import Calendar
+    import roster
+
+    name = f"bench{size}_{round_no}"
+    teacher_id = 10 ** 9 + size * 100 + round_no
+    student_ids = [(size * 100 + round_no) * 10 ** 5 + i for i in range(size)]
+    # Без выходных, чтобы назначение дежурного работало в любой день
+    t = Tenant(name, teacher_id, f"@{name}", 0, os.path.join(directory, f"{name}.db"), Calendar(0, weekend=()))
+    t.open(bot_main.registry.executors)
+    today = t.calendar.today()
+    rng = random.Random(size)
+
+    def fill(conn):
+        conn.execute("INSERT INTO users (user_id, name, role, approved) VALUES (?, 'Классный руководитель', 'teacher', 1)", (teacher_id,))
+        conn.executemany(
+            "INSERT INTO users (user_id, name, role, approved) VALUES (?, ?, 'student', 1)",
+            [(user_id, f"Ученик {i:04d}") for i, user_id in enumerate(student_ids)]
+        )
+        for i in range(size):
+            roster.append(conn, f"Ученик {i:04d}")
+        conn.executemany(
+            "INSERT INTO absences (user_id, start_date, end_date, reason) VALUES (?, ?, NULL, 'болеет')",
+            [(user_id, today) for user_id in rng.sample(student_ids, size // 10)]
+        )
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('rotation_started', 'true')")
+
+    t.db.run_sync(fill)
+    t.users.load(t.db.run_sync(lambda conn: conn.execute("SELECT user_id, name, role, approved FROM users").fetchall()))
+    bot_main.registry.add(t)
+    for user_id in student_ids:
+        bot_main.registry.bind(user_id, t)
+    return t, teacher_id, student_ids
+
+
+# --- Измерение ---
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def measure(bot_main, updates: list, counter: SqlCounter, before=None, concurrency: int = BATCH) -> dict:
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def feed(update):
+        async with slots:
+            if before:
+                before()
+            started = time.perf_counter()
+            await bot_main.dp.feed_update(bot_main.bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    statements = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(update) for update in updates))
+    # Задержка — до ответа на обновление; фоновая работа кнопок входит
+    # в пропускную способность и число SQL
+    await bot_main.background.drain()
+    wall = time.perf_counter() - started
+    return {
+        "updates": len(updates),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "sql_per_update": round((counter.count - statements) / len(updates), 2),
+        "throughput": round(len(updates) / wall, 1),
+    }
+
+async def run_size(bot_main, size: int, directory: str, counter: SqlCounter, round_no: int) -> dict:
+    t, teacher_id, students = build_class(bot_main, size, directory, round_no)
+    results = {}
+    results["morning_burst"] = await measure(
+        bot_main, [message(user_id, "✅ Приду в школу") for user_id in students], counter)
+    # Команды учителя идут по одной (обновления одного пользователя всё равно
+    # обрабатываются по очереди); отчёт каждый раз строится заново
+    results["attendance"] = await measure(
+        bot_main, [message(teacher_id, "/attendance") for _ in range(REPEATS)], counter,
+        before=t.reports.clear, concurrency=1)
+    results["assign_duty"] = await measure(
+        bot_main, [message(teacher_id, "📤 Повторить отчёт в канал") for _ in range(REPEATS)], counter, concurrency=1)
+    results["delete_all"] = await measure(
+        bot_main, [callback(teacher_id, "confirm_delete_all")], counter)
+    return {f"{scenario}/{size}": value for scenario, value in results.items()}
+
+
+# --- Сравнение с эталоном ---
+def wall_ms(result: dict) -> float:
+    return result["updates"] / result["throughput"] * 1000
+
+def regressions(results: dict, baseline: dict) -> list:
+    found = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if current["p99_ms"] > base["p99_ms"] * (1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS:
+            found.append(f"{key}: p99 {current['p99_ms']} мс, эталон {base['p99_ms']} мс")
+        if current["sql_per_update"] > base["sql_per_update"] * (1 + SQL_TOLERANCE) + 0.5:
+            found.append(f"{key}: SQL на обновление {current['sql_per_update']}, эталон {base['sql_per_update']}")
+        # Фоновая работа (удаление всех, отчёт в канал) не входит в p99, но входит
+        # в пропускную способность; сравниваем по времени прогона, чтобы был запас в мс
+        if wall_ms(current) > wall_ms(base) * (1 + THROUGHPUT_TOLERANCE) + LATENCY_SLACK_MS:
+            found.append(f"{key}: {current['throughput']:.1f} обн./с, эталон {base['throughput']} обн./с")
+    return found
+
+def print_table(results: dict):
+    print(f"{'сценарий':<22}{'обновл.':>9}{'p50, мс':>10}{'p99, мс':>10}{'SQL/обн.':>10}{'обн./с':>10}")
+    for key, r in results.items():
+        print(f"{key:<22}{r['updates']:>9}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['sql_per_update']:>10}{r['throughput']:>10}")
+
+
+def best_of(rounds: list) -> dict:
+    # Из нескольких прогонов берём лучшие задержки и пропускную способность:
+    # так меньше шума от соседних процессов; число SQL от прогона не зависит
+    best = {}
+    for results in rounds:
+        for key, r in results.items():
+            b = best.setdefault(key, dict(r))
+            b["p50_ms"] = min(b["p50_ms"], r["p50_ms"])
+            b["p99_ms"] = min(b["p99_ms"], r["p99_ms"])
+            b["throughput"] = max(b["throughput"], r["throughput"])
+    return best
+
+async def run(sizes: list, rounds: int) -> dict:
+    # Подменяем всё до импорта main: лимиты Telegram, счётчик SQL, рабочая папка
+    send_queue.GLOBAL_RATE = send_queue.PRIVATE_RATE = send_queue.GROUP_RATE = 10 ** 9
+    counter = SqlCounter()
+    Database.tracer = counter
+    directory = tempfile.mkdtemp(prefix="bench-")
+    os.chdir(directory)
+    import main as bot_main
+    bot_main.DELIVERY_TRACK_LIMIT = 0  # outbox здесь не разбирается — не ждём доставки
+
+    api = FakeBotAPI()
+    bot_main.bot.session = api
+    measured = []
+    try:
+        for round_no in range(rounds):
+            results = {}
+            for size in sizes:
+                results.update(await run_size(bot_main, size, directory, counter, round_no))
+            measured.append(results)
+    finally:
+        await bot_main.sender.stop()
+        bot_main.registry.close_all()
+    return best_of(measured)
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000])
+    parser.add_argument("--rounds", type=int, default=3, help="сколько раз повторить прогон")
+    parser.add_argument("--update-baseline", action="store_true", help="сохранить результаты как эталон")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    results = asyncio.run(run(args.sizes, args.rounds))
+    print_table(results)
+
+    if args.update_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Эталон сохранён: {BASELINE_FILE}")
+        return 0
+    if not os.path.exists(BASELINE_FILE):
+        print("ℹ️ Эталона нет — запустите с --update-baseline")
+        return 0
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        found = regressions(results, json.load(f))
+    for line in found:
+        print(f"❌ {line}")
+    print("✅ Регрессий нет." if not found else f"Найдено регрессий: {len(found)}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
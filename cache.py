@@ -0,0 +1,58 @@
+# cache.py
+from collections import OrderedDict
+
+
+# === КЭШ ГОТОВЫХ ОТЧЁТОВ ===
+# Ключ — (тип отчёта, период): период это дата "YYYY-MM-DD" или месяц "YYYY-MM".
+# Отметка посещаемости с какой-то даты сбрасывает только отчёты
+# за эту дату и позже, изменение состава класса — все отчёты.
+# Каждый сброс увеличивает generation. Отчёт, который начали строить до
+# сброса (чтение базы шло параллельно с записью), в кэш не кладётся:
+# номер поколения берётся до чтения и передаётся в put.
+
+def hit_stats(hits: int, misses: int, size: int) -> dict:
+    # Общий вид статистики кэшей: отчёты, справочник пользователей, FSM
+    total = hits + misses
+    return {"size": size, "hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+class RenderCache:
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def get(self, kind: str, period: str):
+        key = (kind, period)
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        return None
+
+    def put(self, kind: str, period: str, value, generation: int = None):
+        if generation is not None and generation != self.generation:
+            return value  # пока строили отчёт, данные изменились
+        key = (kind, period)
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return value
+
+    def invalidate_from(self, date: str):
+        # Сравниваем период с префиксом даты той же длины: "2024-05" >= "2024-05"
+        self.generation += 1
+        stale = [key for key in self._items if key[1] >= date[:len(key[1])]]
+        for key in stale:
+            del self._items[key]
+
+    def clear(self):
+        self.generation += 1
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return hit_stats(self.hits, self.misses, len(self._items))
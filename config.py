@@ -3,3 +3,44 @@ BOT_TOKEN = "8358402394:AAFsp3-PPZB5-HixEWLm8wXlARHNszxj7LA"           # ← з
 TEACHER_ID = 1407739698            # ← ваш ID
 TEACHER_TIMEZONE_OFFSET = 5            # ← ваш UTC
 CHANNEL_ID = "@testi_bjtjv"     # ← канал
+
+# Несколько классов в одном боте (необязательно).
+# Если TENANTS не задан, работает один класс с настройками выше.
+# TENANTS = [
+#     {"id": "7a", "teacher_id": 111111111, "channel_id": "@class_7a", "timezone_offset": 5},
+#     {"id": "7b", "teacher_id": 222222222, "channel_id": "@class_7b", "timezone_offset": 5},
+# ]
+
+# Приём обновлений через webhook вместо long polling (необязательно).
+# WEBHOOK_SECRET обязателен: латиница, цифры, _ и -, до 256 символов, например
+# вывод python -c "import secrets; print(secrets.token_urlsafe(32))".
+# WEBHOOK_URL = "https://example.org/webhook"
+# WEBHOOK_SECRET = "Zm9yLWV4YW1wbGUtb25seS1jaGFuZ2UtbWU"
+# WEBHOOK_HOST = "127.0.0.1"
+# WEBHOOK_PORT = 8080
+
+# Обработка обновлений (необязательно): сколько обработчиков работает
+# одновременно и сколько обновлений может ждать у одного пользователя и всего.
+# UPDATE_WORKERS = 16
+# UPDATE_QUEUE_PER_USER = 20
+# UPDATE_QUEUE_TOTAL = 1000
+
+# Состояния диалогов (необязательно): файл базы, размер кэша в памяти
+# и через сколько секунд брошенный диалог забывается.
+# FSM_DB = "fsm_state.db"
+# FSM_CACHE_SIZE = 1024
+# FSM_TTL = 172800
+
+# Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+# (необязательно; METRICS_PORT = None отключает сервер).
+# METRICS_HOST = "127.0.0.1"
+# METRICS_PORT = 9108
+
+# Выбор дежурного (необязательно): "fair" — дольше всех не дежуривший,
+# "queue" — строго по очереди.
+# DUTY_ENGINE = "fair"
+
+# Праздники и каникулы (необязательно): в эти дни дежурный не назначается.
+# У класса в TENANTS можно задать свои "holidays" и "vacations".
+# HOLIDAYS = ["2025-11-04", "2026-01-01"]
+# VACATIONS = [("2025-12-29", "2026-01-11")]
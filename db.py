@@ -0,0 +1,154 @@
+# db.py
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# === АСИНХРОННЫЙ ДОСТУП К БАЗЕ ===
+# Все запросы выполняются в отдельных потоках, а не в цикле событий:
+# запись — в одном потоке-писателе, чтение — в небольшом пуле.
+# У каждого потока своё соединение, журнал в режиме WAL,
+# поэтому читатели не ждут fsync писателя.
+
+class Executors:
+    # Общие потоки для многих баз (шардов классов): сотни баз не должны
+    # держать по своему потоку-писателю и пулу читателей. Каждая база
+    # закрепляется за одним писателем, поэтому её записи идут по порядку.
+    def __init__(self, writers: int = 2, readers: int = 4):
+        self.writers = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"db-writer-{i}") for i in range(writers)
+        ]
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self._next = 0
+
+    def writer(self) -> ThreadPoolExecutor:
+        pool = self.writers[self._next % len(self.writers)]
+        self._next += 1
+        return pool
+
+    def shutdown(self):
+        for pool in self.writers:
+            pool.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
+
+
+class Database:
+    # Необязательный обработчик каждого SQL-оператора (например, счётчик
+    # в bench.py); действует для соединений, открытых после его установки
+    tracer = None
+    # Необязательный приёмник статистики: observer(statements, seconds)
+    # вызывается в цикле событий после каждого запроса (см. metrics.py)
+    observer = None
+
+    def __init__(self, path: str, readers: int = 2, executors: Executors = None, cache_kib: int = None):
+        self.path = path
+        self.cache_kib = cache_kib  # предел кэша страниц на соединение (None — по умолчанию SQLite)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._shared = executors is not None
+        if self._shared:
+            self._writer = executors.writer()
+            self._readers = executors.readers
+        else:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+
+    # --- Соединения (по одному на поток) ---
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            if self.cache_kib:
+                conn.execute(f"PRAGMA cache_size=-{self.cache_kib}")
+            if Database.tracer is not None or Database.observer is not None:
+                conn.set_trace_callback(self._trace)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _trace(self, statement: str):
+        self._local.statements = getattr(self._local, "statements", 0) + 1
+        if Database.tracer is not None:
+            Database.tracer(statement)
+
+    def _read(self, sql: str, params, one: bool):
+        cur = self._connection().execute(sql, params)
+        try:
+            return cur.fetchone() if one else cur.fetchall()
+        finally:
+            cur.close()
+
+    def _snapshot(self, fn, args):
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            return fn(conn, *args)
+        finally:
+            conn.execute("COMMIT")
+
+    def _write(self, fn, args):
+        conn = self._connection()
+        with conn:
+            return fn(conn, *args)
+
+    def _measured(self, stats: list, fn, *args):
+        # Число операторов и время выполнения в потоке → stats
+        before = getattr(self._local, "statements", 0)
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stats[:] = getattr(self._local, "statements", 0) - before, time.perf_counter() - started
+
+    async def _run(self, pool, fn, *args):
+        loop = asyncio.get_running_loop()
+        if Database.observer is None:
+            return await loop.run_in_executor(pool, fn, *args)
+        stats = [0, 0.0]
+        try:
+            return await loop.run_in_executor(pool, self._measured, stats, fn, *args)
+        finally:
+            Database.observer(*stats)
+
+    # --- Чтение ---
+    async def fetchone(self, sql: str, params=()):
+        return await self._run(self._readers, self._read, sql, params, True)
+
+    async def fetchall(self, sql: str, params=()):
+        return await self._run(self._readers, self._read, sql, params, False)
+
+    async def snapshot(self, fn, *args):
+        # fn(conn, *args) читает несколько запросов из одного снимка базы
+        return await self._run(self._readers, self._snapshot, fn, args)
+
+    # --- Запись (каждый вызов — одна транзакция) ---
+    async def execute(self, sql: str, params=()) -> int:
+        return await self.transaction(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def transaction(self, fn, *args):
+        # fn(conn, *args) выполняется в потоке-писателе внутри одной транзакции
+        return await self._run(self._writer, self._write, fn, args)
+
+    # --- Синхронные операции при старте ---
+    def run_sync(self, fn, *args):
+        return self._writer.submit(self._write, fn, args).result()
+
+    def executescript(self, script: str):
+        self._writer.submit(lambda: self._connection().executescript(script)).result()
+
+    def close(self):
+        # Общие потоки останавливает их владелец (Executors.shutdown)
+        if not self._shared:
+            self._writer.shutdown(wait=True)
+            self._readers.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
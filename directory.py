@@ -0,0 +1,94 @@
+# directory.py
+from collections import namedtuple
+
+from cache import hit_stats
+
+
+# === СПРАВОЧНИК ПОЛЬЗОВАТЕЛЕЙ В ПАМЯТИ ===
+# Копия таблицы users класса: индекс по user_id и по имени.
+# Загружается целиком при открытии базы и обновляется сразу после
+# каждой записи в users (регистрация, одобрение, отклонение, удаление),
+# поэтому чтение по id или имени не обращается к SQLite.
+# Промах (misses) — запрошенного пользователя нет в классе.
+
+UserRecord = namedtuple("UserRecord", "user_id name role approved")
+
+class UserDirectory:
+    def __init__(self):
+        self._by_id = {}
+        self._by_name = {}  # name -> [user_id] в порядке добавления
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, rows):
+        self._by_id.clear()
+        self._by_name.clear()
+        for user_id, name, role, approved in rows:
+            self.put(user_id, name, role, approved)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    # --- Чтение ---
+    def _count(self, record):
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def get(self, user_id: int):
+        return self._count(self._by_id.get(user_id))
+
+    def by_name(self, name: str, role: str = None, approved: bool = None):
+        for user_id in self._by_name.get(name, ()):
+            record = self._by_id[user_id]
+            if role is not None and record.role != role:
+                continue
+            if approved is not None and bool(record.approved) != approved:
+                continue
+            return self._count(record)
+        return self._count(None)
+
+    def students(self):
+        return [record for record in self if record.role == "student"]
+
+    # --- Запись (после успешного commit) ---
+    def put(self, user_id: int, name: str, role: str, approved: int = 0):
+        self.remove(user_id)
+        self._by_id[user_id] = UserRecord(user_id, name, role, approved)
+        self._by_name.setdefault(name, []).append(user_id)
+
+    def add_if_missing(self, user_id: int, name: str, role: str, approved: int = 0):
+        if user_id not in self._by_id:
+            self.put(user_id, name, role, approved)
+
+    def approve(self, user_id: int):
+        record = self._by_id.get(user_id)
+        if record:
+            self._by_id[user_id] = record._replace(approved=1)
+
+    def remove(self, user_id: int):
+        record = self._by_id.pop(user_id, None)
+        if record is None:
+            return None
+        ids = self._by_name[record.name]
+        ids.remove(user_id)
+        if not ids:
+            del self._by_name[record.name]
+        return record
+
+    def remove_by_name(self, name: str, role: str):
+        for user_id in list(self._by_name.get(name, ())):
+            if self._by_id[user_id].role == role:
+                self.remove(user_id)
+
+    def remove_students(self):
+        for record in self.students():
+            self.remove(record.user_id)
+
+    def stats(self) -> dict:
+        return hit_stats(self.hits, self.misses, len(self._by_id))
@@ -0,0 +1,71 @@
+# duty.py
+import copy
+import heapq
+from collections import namedtuple
+
+
+# === ВЫБОР ДЕЖУРНОГО ===
+# Движок получает очередь дежурных (roster.entries) и выбирает одного
+# из пришедших учеников. Кандидаты лежат в куче по ключу движка, поэтому
+# выбор стоит O(log n) плюс по O(log n) на каждого пропущенного отсутствующего.
+# Выбранный сразу получает новый ключ (дата дежурства, счётчик), так что
+# несколько вызовов pick подряд дают план на несколько дней вперёд.
+# Движок выбирается по имени через ENGINES (DUTY_ENGINE в config.py).
+
+DutyEntry = namedtuple("DutyEntry", "name position served last_served")
+
+class DutyEngine:
+    def __init__(self, entries):
+        self._heap = [(self.key(entry), entry) for entry in entries]
+        heapq.heapify(self._heap)
+        self._tail = max((entry.position for entry in entries), default=0)
+
+    def key(self, entry: DutyEntry):
+        raise NotImplementedError
+
+    def __len__(self):
+        return len(self._heap)
+
+    def pick(self, present: set, date: str):
+        # Возвращает выбранного ученика или None, если никто из очереди не пришёл
+        skipped = []
+        chosen = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if item[1].name in present:
+                chosen = item[1]
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        if chosen is None:
+            return None
+        self._tail += 1
+        served = chosen._replace(served=chosen.served + 1, last_served=date, position=self._tail)
+        heapq.heappush(self._heap, (self.key(served), served))
+        return chosen
+
+    def plan(self, days) -> list:
+        # days — [(дата, множество пришедших)]; очередь движка не меняется
+        clone = copy.copy(self)
+        clone._heap = list(self._heap)
+        return [(date, clone.pick(present, date)) for date, present in days]
+
+
+class FairRotation(DutyEngine):
+    # Дольше всех не дежуривший; при равенстве — с меньшим числом дежурств,
+    # затем по месту в очереди
+    def key(self, entry: DutyEntry):
+        return (entry.last_served or "", entry.served, entry.position)
+
+
+class QueueRotation(DutyEngine):
+    # Строго по очереди: первый пришедший, выбранный уходит в конец
+    def key(self, entry: DutyEntry):
+        return (entry.position,)
+
+
+ENGINES = {
+    "fair": FairRotation,
+    "queue": QueueRotation,
+}
@@ -0,0 +1,130 @@
+# fsmstore.py
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DEFAULT_DESTINY
+
+import schema
+from cache import hit_stats
+from db import Database
+
+
+# === ХРАНИЛИЩЕ СОСТОЯНИЙ FSM В SQLITE ===
+# Незаконченные диалоги («введите имя», «укажите причину») переживают
+# перезапуск бота. Строка есть только у пользователя посреди диалога:
+# state.clear() удаляет её. Данные — компактный JSON, пустые — NULL.
+# Спереди небольшой LRU-кэш: FSM читает состояние на каждом обновлении,
+# а у большинства пользователей его нет — это тоже запоминается.
+# Диалоги, брошенные дольше TTL, считаются закрытыми и удаляются.
+
+CACHE_SIZE = 1024
+TTL = 2 * 24 * 3600       # брошенный диалог живёт двое суток
+EVICT_INTERVAL = 3600
+
+_EMPTY = (None, None, 0)  # (состояние, данные в JSON, время изменения)
+
+def _scope(key) -> str:
+    # Обычный ключ — пустая строка; темы, бизнес-чаты и другие destiny — в тексте
+    if key.thread_id is None and key.business_connection_id is None and key.destiny == DEFAULT_DESTINY:
+        return ""
+    return f"{key.thread_id or ''}:{key.business_connection_id or ''}:{key.destiny}"
+
+def _encode(data: dict):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data else None
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE, ttl: int = TTL):
+        self.path = path
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.db = None
+        self._cache = OrderedDict()  # (chat_id, user_id, scope) -> _EMPTY-подобный кортеж
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def open(self):
+        self.db = Database(self.path, readers=1)
+        self.db.executescript(schema.FSM_SCHEMA)
+        return self
+
+    # --- Кэш ---
+    def _remember(self, k, record):
+        self._cache[k] = record
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key):
+        k = (key.chat_id, key.user_id, _scope(key))
+        record = self._cache.get(k)
+        if record is not None:
+            self._cache.move_to_end(k)
+            self.hits += 1
+        else:
+            self.misses += 1
+            row = await self.db.fetchone(
+                "SELECT state, data, updated_at FROM fsm_state WHERE chat_id=? AND user_id=? AND scope=?", k
+            )
+            record = tuple(row) if row else _EMPTY
+            self._remember(k, record)
+        if record[2] and record[2] < time.time() - self.ttl:
+            record = _EMPTY
+            self._remember(k, record)
+        return k, record
+
+    async def _save(self, k, record, state, data):
+        if state is None and data is None:
+            self._remember(k, _EMPTY)
+            if record is _EMPTY:
+                return  # строки и так нет
+            await self.db.execute("DELETE FROM fsm_state WHERE chat_id=? AND user_id=? AND scope=?", k)
+            return
+        now = int(time.time())
+        self._remember(k, (state, data, now))
+        await self.db.execute(
+            "INSERT OR REPLACE INTO fsm_state (chat_id, user_id, scope, state, data, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (*k, state, data, now)
+        )
+
+    # --- BaseStorage ---
+    async def set_state(self, key, state=None):
+        k, record = await self._load(key)
+        await self._save(k, record, state.state if isinstance(state, State) else state, record[1])
+
+    async def get_state(self, key):
+        return (await self._load(key))[1][0]
+
+    async def set_data(self, key, data):
+        k, record = await self._load(key)
+        await self._save(k, record, record[0], _encode(data))
+
+    async def get_data(self, key):
+        data = (await self._load(key))[1][1]
+        return json.loads(data) if data else {}
+
+    async def close(self):
+        if self.db:
+            self.db.close()
+
+    # --- Очистка брошенных диалогов ---
+    async def evict(self) -> int:
+        deadline = int(time.time()) - self.ttl
+        removed = await self.db.execute("DELETE FROM fsm_state WHERE updated_at < ?", (deadline,))
+        stale = [k for k, record in self._cache.items() if record[2] and record[2] < deadline]
+        for k in stale:
+            del self._cache[k]
+        self.evicted += removed
+        return removed
+
+    async def run(self, interval: int = EVICT_INTERVAL):
+        while True:
+            await self.evict()
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {**hit_stats(self.hits, self.misses, len(self._cache)), "evicted": self.evicted}
@@ -0,0 +1,74 @@
+# jobs.py
+import asyncio
+import time
+import uuid
+
+import metrics
+
+
+# === ФОНОВЫЕ ЗАДАЧИ ДЛЯ КНОПОК ===
+# Нажатие inline-кнопки подтверждается сразу, а тяжёлая часть работает
+# отдельной задачей и показывает ход выполнения правкой исходного сообщения.
+# Повторное нажатие той же кнопки, пока задача идёт, ничего не запускает.
+# Задача наследует контекст обработчика (текущий класс), но её SQL
+# не приписывается к уже завершённому обновлению.
+
+PROGRESS_INTERVAL = 2.0  # промежуточные правки — не чаще раза в 2 с
+
+class Job:
+    def __init__(self, key, kind: str, edit):
+        self.key = key
+        self.kind = kind
+        self.id = uuid.uuid4().hex[:12]
+        self._edit = edit
+        self._text = None
+        self._edited = 0.0
+
+    async def progress(self, text: str, final: bool = False):
+        now = time.monotonic()
+        if text == self._text or (not final and now - self._edited < PROGRESS_INTERVAL):
+            return
+        self._text, self._edited = text, now
+        await self._edit(text)
+
+
+class JobTracker:
+    def __init__(self):
+        self._running = {}  # ключ -> задача asyncio
+        self.started = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._running)
+
+    def start(self, key, kind: str, work, edit) -> bool:
+        # work(job) — корутина; edit(text) правит исходное сообщение
+        if key in self._running:
+            self.deduplicated += 1
+            return False
+        job = Job(key, kind, edit)
+        self._running[key] = asyncio.create_task(self._run(job, work))
+        self.started += 1
+        return True
+
+    async def _run(self, job: Job, work):
+        metrics.current_update.set(None)
+        started = time.perf_counter()
+        try:
+            await work(job)
+        except Exception as e:
+            self.failed += 1
+            print(f"[Ошибка] {job.kind}: {e}")
+            try:
+                await job.progress(f"❌ Ошибка: {e}", final=True)
+            except Exception as e:
+                print(f"[Ошибка] {e}")
+        finally:
+            self._running.pop(job.key, None)
+            metrics.metrics.observe("bot_job_seconds", time.perf_counter() - started, kind=job.kind)
+
+    async def drain(self):
+        # Дождаться всех задач (остановка бота, нагрузочный тест)
+        while self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
@@ -1,185 +1,251 @@
 # main.py
 import asyncio
-import sqlite3
-import re
-from datetime import datetime, timedelta
+import time
+import uuid
+from datetime import datetime
 
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 # === НАСТРОЙКИ ИЗ config.py ===
 import config
+import analytics
+import attendance
+import fsmstore
+import jobs
+import metrics
+import onboarding
+import outbox
+import roster
+import tenants
+from scheduler import Scheduler, DailyJob
+from duty import ENGINES
+from sender import SendQueue, TEACHER, BROADCAST
+from msgsync import MessageSync
+from webhook import WebhookServer, check_secret
+from ordering import UserOrderMiddleware
+from db import Database
+from tenants import tenant
 
 BOT_TOKEN = config.BOT_TOKEN
-TEACHER_ID = config.TEACHER_ID
-CHANNEL_ID = config.CHANNEL_ID
-TEACHER_TIMEZONE_OFFSET = config.TEACHER_TIMEZONE_OFFSET
 
 # === БОТ И ДИСПЕТЧЕР ===
+# Состояния диалогов хранятся в SQLite и переживают перезапуск;
+# брошенные дольше FSM_TTL секунд удаляются.
+fsm_storage = fsmstore.SQLiteStorage(
+    getattr(config, "FSM_DB", "fsm_state.db"),
+    cache_size=getattr(config, "FSM_CACHE_SIZE", fsmstore.CACHE_SIZE),
+    ttl=getattr(config, "FSM_TTL", fsmstore.TTL),
+)
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-
-# === СОСТОЯНИЕ БОТА ===
-bot_active = True
-
-# === ТЕКУЩИЙ КАНАЛ ===
-current_channel = CHANNEL_ID
-
-# === БАЗА ДАННЫХ ===
-conn = sqlite3.connect("school_bot.db", check_same_thread=False)
-cursor = conn.cursor()
-
-# === Таблицы ===
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        name TEXT,
-        role TEXT,
-        approved INTEGER DEFAULT 0
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS duty_roster (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS duty_message (
-        id INTEGER PRIMARY KEY,
-        message_id INTEGER
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS settings (
-        key TEXT PRIMARY KEY,
-        value TEXT
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS attendance (
-        user_id INTEGER,
-        date TEXT,
-        status TEXT,
-        reason TEXT,
-        PRIMARY KEY (user_id, date)
-    )
-''')
-
-# Инициализация канала по умолчанию
-cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('channel', ?)", (CHANNEL_ID,))
-conn.commit()
+dp = Dispatcher(storage=fsm_storage)
+
+# === ОЧЕРЕДЬ ОТПРАВКИ ===
+sender = SendQueue(bot)
+
+# === МЕТРИКИ ===
+# Задержки обработчиков и запросов к Bot API, SQL на обновление.
+# Отдаются на http://METRICS_HOST:METRICS_PORT/metrics и командой /perf.
+METRICS_HOST = getattr(config, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT = getattr(config, "METRICS_PORT", 9108)  # None — не запускать сервер
+
+# Наблюдатель ставится до открытия баз, чтобы считались все соединения
+Database.observer = metrics.record_sql
+dp.message.middleware(metrics.HandlerMetricsMiddleware())
+dp.callback_query.middleware(metrics.HandlerMetricsMiddleware())
+bot.session.middleware(metrics.ApiMetricsMiddleware())
+
+# === КЛАССЫ ===
+# У каждого класса свой учитель, канал, часовой пояс, состояние «Стоп/Старт»,
+# база и кэш отчётов. Middleware определяет класс по пользователю.
+registry = tenants.load_tenants(config)
+registry.open_all()
+fsm_storage.open()
+
+# === ПОРЯДОК ОБРАБОТКИ ===
+# Разные пользователи обслуживаются параллельно, один пользователь — по очереди.
+# Middleware встаёт перед FSM: состояние пользователя читается только
+# после того, как закончилась обработка его предыдущего обновления.
+update_order = UserOrderMiddleware(
+    workers=getattr(config, "UPDATE_WORKERS", 16),
+    per_user=getattr(config, "UPDATE_QUEUE_PER_USER", 20),
+    total=getattr(config, "UPDATE_QUEUE_TOTAL", 1000),
+)
+dp.update.outer_middleware.unregister(dp.fsm)
+dp.update.outer_middleware(metrics.UpdateMetricsMiddleware())
+dp.update.outer_middleware(update_order)
+dp.update.outer_middleware(dp.fsm)
+dp.update.outer_middleware(tenants.TenantMiddleware(registry))
+
+# === ИСХОДЯЩИЙ ЯЩИК ===
+message_sync = MessageSync(sender)
+outbox_dispatcher = outbox.OutboxDispatcher(registry, sender, message_sync)
 
 # === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===
 
-def get_duty_list():
-    cursor.execute("SELECT name FROM duty_roster ORDER BY id ASC")
-    return [row[0] for row in cursor.fetchall()]
+async def get_duty_list():
+    return await tenant().db.snapshot(roster.names)
 
-def add_to_duty_roster(name: str):
-    cursor.execute("INSERT INTO duty_roster (name) VALUES (?)", (name,))
-    conn.commit()
+async def sort_duty_roster():
+    return await tenant().db.transaction(roster.resort)
 
-def remove_from_duty_roster(name: str):
-    cursor.execute("DELETE FROM duty_roster WHERE name=?", (name,))
-    conn.commit()
+# Движок выбора дежурного: "fair" — дольше всех не дежуривший, "queue" — строго по очереди
+DutyEngine = ENGINES[getattr(config, "DUTY_ENGINE", "fair")]
 
-def clear_duty_roster():
-    cursor.execute("DELETE FROM duty_roster")
-    conn.commit()
+async def duty_engine():
+    return DutyEngine(await tenant().db.snapshot(roster.entries))
 
-def remove_first_from_duty():
-    names = get_duty_list()
-    if not names:
-        return None
-    first = names[0]
-    cursor.execute("DELETE FROM duty_roster WHERE rowid IN (SELECT rowid FROM duty_roster LIMIT 1)")
-    conn.commit()
-    return first
-
-def add_to_end_of_duty(name: str):
-    cursor.execute("INSERT INTO duty_roster (name) VALUES (?)", (name,))
-    conn.commit()
-
-def save_duty_message_id(message_id: int):
-    cursor.execute("INSERT OR REPLACE INTO duty_message (id, message_id) VALUES (1, ?)", (message_id,))
-    conn.commit()
-
-def get_duty_message_id() -> int:
-    cursor.execute("SELECT message_id FROM duty_message WHERE id=1")
-    row = cursor.fetchone()
-    return row[0] if row else None
-
-def save_setting(key: str, value: str):
-    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-    conn.commit()
-
-def load_setting(key: str, default: str):
-    cursor.execute("SELECT value FROM settings WHERE key=?", (key,))
-    row = cursor.fetchone()
+async def save_setting(key: str, value: str):
+    await tenant().db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+async def load_setting(key: str, default: str):
+    row = await tenant().db.fetchone("SELECT value FROM settings WHERE key=?", (key,))
     return row[0] if row else default
 
 # === Посещаемость ===
 def get_dates_in_month():
-    today = datetime.now()
-    year, month = today.year, today.month
-    current = datetime(year, month, 1)
-    dates = []
-    while current.month == month:
-        dates.append(current.strftime("%Y-%m-%d"))
-        current += timedelta(days=1)
-    return dates
-
-def update_attendance(user_id: int, date: str, status: str, reason: str = None):
-    cursor.execute('''
-        INSERT OR REPLACE INTO attendance (user_id, date, status, reason)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, date, status, reason))
-    conn.commit()
-
-def get_attendance_for_user(user_id: int):
-    dates = get_dates_in_month()
-    attendance = {}
-    for date in dates:
-        cursor.execute(
-            "SELECT status, reason FROM attendance WHERE user_id=? AND date=?",
-            (user_id, date)
-        )
-        row = cursor.fetchone()
-        if row:
-            attendance[date] = row
-        else:
-            attendance[date] = ("present", None)
-    return attendance
-
-def set_absent_from_date(user_id: int, start_date: str, reason: str):
-    dates = get_dates_in_month()
-    try:
-        start_index = dates.index(start_date)
-    except ValueError:
-        start_index = 0
-    for date in dates[start_index:]:
-        update_attendance(user_id, date, "absent", reason)
-
-def clear_future_absent_from(user_id: int, start_date: str):
-    dates = get_dates_in_month()
-    try:
-        start_index = dates.index(start_date)
-    except ValueError:
-        start_index = 0
-    for date in dates[start_index:]:
-        update_attendance(user_id, date, "present", None)
+    # Учебные дни текущего месяца класса (список берётся из кэша календаря)
+    cal = tenant().calendar
+    return list(cal.month_working_days(cal.today()[:7]))
+
+async def set_absent_from_date(user_id: int, start_date: str, reason: str):
+    await attendance.set_absent_from(tenant().db, user_id, start_date, reason)
+    tenant().reports.invalidate_from(start_date)
+
+async def clear_future_absent_from(user_id: int, start_date: str):
+    await attendance.clear_absent_from(tenant().db, user_id, start_date)
+    tenant().reports.invalidate_from(start_date)
+
+def _approve_student_rows(conn, user_id: int, today: str, welcome_markup):
+    conn.execute("UPDATE users SET approved=1 WHERE user_id=?", (user_id,))
+    row = conn.execute("SELECT name FROM users WHERE user_id=?", (user_id,)).fetchone()
+    if row:
+        attendance.close_absences(conn, user_id, today)
+        roster.append(conn, row[0])
+        conn.execute("DELETE FROM expected_students WHERE name=?", (row[0],))
+        outbox.enqueue(conn, user_id, "✅ Вы приняты! Вы в списке дежурных.", reply_markup=welcome_markup)
+    return row
+
+def _decline_student_rows(conn, user_id: int):
+    conn.execute("DELETE FROM users WHERE user_id=?", (user_id,))
+    outbox.enqueue(conn, user_id, "❌ Ваша заявка отклонена.")
+
+def _delete_student_rows(conn, user_id: int, name: str) -> int:
+    deleted = conn.execute("DELETE FROM users WHERE name=? AND role='student'", (name,)).rowcount
+    if deleted:
+        outbox.enqueue(conn, user_id, "🚫 Вы удалены из класса.", reply_markup=types.ReplyKeyboardRemove())
+    roster.remove(conn, name)
+    conn.execute("DELETE FROM attendance WHERE user_id=?", (user_id,))
+    conn.execute("DELETE FROM attendance_archive WHERE user_id=?", (user_id,))
+    conn.execute("DELETE FROM attendance_archive_absences WHERE user_id=?", (user_id,))
+    conn.execute("DELETE FROM absences WHERE user_id=?", (user_id,))
+    return deleted
+
+def _delete_all_students_rows(conn, batch: str = None):
+    students = conn.execute("SELECT user_id FROM users WHERE role='student'").fetchall()
+    conn.execute("DELETE FROM users WHERE role='student'")
+    for (user_id,) in students:
+        outbox.enqueue(conn, user_id, "🚫 Все данные сброшены.", key=outbox.batch_key(batch, user_id) if batch else None,
+                       priority=BROADCAST, reply_markup=types.ReplyKeyboardRemove())
+    roster.clear(conn)
+    conn.execute("DELETE FROM attendance")
+    conn.execute("DELETE FROM attendance_archive")
+    conn.execute("DELETE FROM attendance_archive_absences")
+    conn.execute("DELETE FROM absences")
+    conn.execute("DELETE FROM expected_students")
+    return students
+
+# === Массовый приём: одна транзакция на весь список ===
+IMPORT_SHOW_INVALID = 10       # сколько нераспознанных строк показать учителю
+IMPORT_MAX_FILE = 1024 * 1024  # CSV больше мегабайта не принимаем
+
+def _onboarding_done(rows, resorted: bool):
+    for user_id, _ in rows:
+        tenant().users.approve(user_id)
+    tenant().reports.clear()
+    outbox_dispatcher.wake(tenant())
+    return "\n📋 Список дежурных отсортирован по алфавиту." if resorted else ""
+
+async def approve_all_pending(batch: str = None):
+    rows, resorted = await tenant().db.transaction(
+        onboarding.approve_pending, tenant().calendar.today(), get_student_kb(), batch
+    )
+    if not rows:
+        return 0, "ℹ️ Ожидающих заявок нет."
+    return len(rows), f"✅ Принято заявок: {len(rows)}." + _onboarding_done(rows, resorted)
+
+async def import_class_list(text: str) -> str:
+    names, invalid = onboarding.parse_names(text)
+    lines = []
+    if names:
+        added, waiting = await tenant().db.transaction(onboarding.import_names, names)
+        lines.append(f"📥 В списке класса: {len(names)}, новых: {added}.")
+        if waiting:
+            lines.append(f"⏳ Заявок с именами из списка: {waiting}. "
+                         "Примите их кнопкой «✅ Принять всех ожидающих» или командой /approve_all.")
+    else:
+        lines.append("📥 Имён не найдено.")
+    if invalid:
+        lines.append(f"\n⚠️ Не распознано ({len(invalid)}), нужно «Имя Фамилия» кириллицей:")
+        lines += invalid[:IMPORT_SHOW_INVALID]
+    return "\n".join(lines)
 
-# === Проверка выходных ===
+# === Проверка выходных и праздников ===
 def is_weekend():
-    return datetime.now().weekday() >= 5
+    cal = tenant().calendar
+    return not cal.is_working_day(cal.today())
+
+# === Отправка через очередь ===
+# Обработчики не ждут отправки: чат учителя ограничен 1 сообщением в секунду,
+# и ожидание держало бы слот UserOrderMiddleware. Ошибки только логируются.
+def _log_send_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception():
+        print(f"[Ошибка] {future.exception()}")
+
+def notify_teacher(text: str, **kwargs):
+    future = sender.send_message(tenant().teacher_id, text, TEACHER, **kwargs)
+    future.add_done_callback(_log_send_failure)
+
+def edit_callback_message(callback: types.CallbackQuery, text: str, **kwargs) -> asyncio.Future:
+    # Фоновая задача может дождаться правки (await), обработчик — нет
+    future = sender.edit_message_text(
+        text, chat_id=callback.message.chat.id, message_id=callback.message.message_id, priority=TEACHER, **kwargs
+    )
+    future.add_done_callback(_log_send_failure)
+    return future
+
+# === ФОНОВЫЕ ЗАДАЧИ КНОПОК ===
+# Кнопка подтверждается сразу, работа идёт в фоне с правками сообщения;
+# повторное нажатие той же кнопки во время работы ничего не запускает.
+background = jobs.JobTracker()
+DELIVERY_TRACK_LIMIT = 600  # за доставкой уведомлений следим не дольше 10 минут
+
+async def run_in_background(callback: types.CallbackQuery, kind: str, work, ack: str) -> bool:
+    started = background.start(
+        (tenant().id, callback.data), kind, work, lambda text: edit_callback_message(callback, text)
+    )
+    await callback.answer(ack if started else "⏳ Уже выполняется…")
+    return started
+
+async def track_delivery(job: jobs.Job, total: int, header: str):
+    # Показывает, сколько уведомлений пачки job.id уже доставлено
+    if not total:
+        await job.progress(header, final=True)
+        return
+    deadline = time.monotonic() + DELIVERY_TRACK_LIMIT
+    while True:
+        counts = await outbox.batch_progress(tenant().db, job.id)
+        text = f"{header}\n📨 Уведомлено: {counts.get('sent', 0)} из {total}"
+        if counts.get("failed"):
+            text += f", не доставлено: {counts['failed']}"
+        finished = counts.get("sent", 0) + counts.get("failed", 0) >= total or time.monotonic() >= deadline
+        await job.progress(text, final=finished)
+        if finished:
+            return
+        await asyncio.sleep(jobs.PROGRESS_INTERVAL)
 
 # === СОСТОЯНИЯ FSM ===
 class Registration(StatesGroup):
@@ -188,10 +254,11 @@ class Registration(StatesGroup):
     awaiting_duty_name = State()
     awaiting_delete_name = State()
     awaiting_delete_confirm = State()
+    awaiting_import = State()
 
 # === КЛАВИАТУРЫ ===
 def get_student_kb():
-    if bot_active:
+    if tenant().active:
         return ReplyKeyboardMarkup(resize_keyboard=True, keyboard=[
             [KeyboardButton(text="✅ Приду в школу")],
             [KeyboardButton(text="❌ Не приду")],
@@ -201,7 +268,7 @@ def get_student_kb():
         return types.ReplyKeyboardRemove()
 
 def get_teacher_kb():
-    if bot_active:
+    if tenant().active:
         return ReplyKeyboardMarkup(resize_keyboard=True, keyboard=[
             [KeyboardButton(text="📋 Список класса")],
             [KeyboardButton(text="📊 Посещаемость")],
@@ -221,7 +288,8 @@ def get_approval_kb(user_id: int):
         [
             InlineKeyboardButton(text="✅ Согласить", callback_data=f"approve_{user_id}"),
             InlineKeyboardButton(text="❌ Отклонить", callback_data=f"decline_{user_id}")
-        ]
+        ],
+        [InlineKeyboardButton(text="✅ Принять всех ожидающих", callback_data="bulk_approve")]
     ])
 
 def get_confirm_kb():
@@ -233,93 +301,160 @@ def get_confirm_kb():
     ])
 
 # === Назначение дежурного в 8:25 ===
-async def assign_daily_duty():
-    if not bot_active or is_weekend():
+async def assign_daily_duty(run_id: str = None):
+    if not tenant().active or is_weekend():
         return
 
-    save_setting("rotation_started", "true")
+    today_str = tenant().calendar.today()
+    # Ключ запуска: плановое назначение выполняется не больше раза в день,
+    # ручной повтор отчёта получает свой ключ
+    run_id = run_id or today_str
 
-    roster = get_duty_list()
-    if not roster:
-        await bot.send_message(TEACHER_ID, "⚠️ Список дежурных пуст.")
+    engine = await duty_engine()
+    if not len(engine):
+        await save_setting("rotation_started", "true")
+        notify_teacher("⚠️ Список дежурных пуст.")
         return
 
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    cursor.execute("SELECT name FROM users WHERE user_id IN (SELECT user_id FROM attendance WHERE date=? AND status='present') AND approved=1", (today_str,))
-    present_names = [row[0] for row in cursor.fetchall()]
+    rows = await attendance.roster_with_status(tenant().db, today_str)
+    present_names = [name for _, name, status, _ in rows if status == "present"]
 
     if not present_names:
-        msg = "🧹 Дежурства на сегодня:\nНикто не приходит."
-        try:
-            await bot.send_message(current_channel, msg)
-        except Exception as e:
-            await bot.send_message(TEACHER_ID, f"❌ Ошибка в канале: {e}")
-        await bot.send_message(TEACHER_ID, "🚫 Сегодня никто не приходит — дежурных нет.")
+        await tenant().db.transaction(_no_duty_rows, tenant(), run_id)
+        outbox_dispatcher.wake(tenant())
         return
 
-    daily_duty = None
-    for name in roster:
-        if name in present_names:
-            daily_duty = name
-            break
+    chosen = engine.pick(set(present_names), today_str)
+    daily_duty = chosen.name if chosen else None
 
     if not daily_duty:
         daily_duty = present_names[0]
-        await bot.send_message(TEACHER_ID, f"⚠️ Назначен: {daily_duty}")
+        notify_teacher(f"⚠️ Назначен: {daily_duty}")
 
-    remove_first_from_duty()
-
-    cursor.execute("SELECT user_id FROM users WHERE name=?", (daily_duty,))
-    row = cursor.fetchone()
-    if not row:
-        await bot.send_message(TEACHER_ID, f"❌ Ошибка: {daily_duty} не найден.")
+    record = tenant().users.by_name(daily_duty)
+    if not record:
+        notify_teacher(f"❌ Ошибка: {daily_duty} не найден.")
         return
-    user_id = row[0]
 
-    msg = f"🧹 Дежурства на сегодня:\nДежурит: {daily_duty}"
-    try:
-        sent = await bot.send_message(current_channel, msg)
-        save_duty_message_id(sent.message_id)
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"❌ Ошибка: {e}")
+    await tenant().db.transaction(_assign_duty_rows, tenant(), run_id, today_str, daily_duty, record.user_id)
+    outbox_dispatcher.wake(tenant())
 
-    try:
-        await bot.send_message(user_id, "🧹 Вы дежурный сегодня! Не забудьте отчитаться.")
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"⚠️ Не удалось оповестить {daily_duty}: {e}")
+def _duty_already_assigned(conn, run_id: str) -> bool:
+    return conn.execute("SELECT 1 FROM outbox WHERE key=?", (f"duty:{run_id}:channel",)).fetchone() is not None
 
-    await bot.send_message(TEACHER_ID, f"✅ Дежурный назначен: <b>{daily_duty}</b>", parse_mode="HTML")
+def _no_duty_rows(conn, t, run_id: str):
+    if _duty_already_assigned(conn, run_id):
+        return
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('rotation_started', 'true')")
+    outbox.enqueue(conn, t.channel, "🧹 Дежурства на сегодня:\nНикто не приходит.", outbox.DUTY_POST,
+                   key=f"duty:{run_id}:channel", failure_note="❌ Ошибка в канале")
+    outbox.enqueue(conn, t.teacher_id, "🚫 Сегодня никто не приходит — дежурных нет.",
+                   key=f"duty:{run_id}:teacher", priority=TEACHER)
+
+def _assign_duty_rows(conn, t, run_id: str, date: str, daily_duty: str, user_id: int):
+    if _duty_already_assigned(conn, run_id):
+        return
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('rotation_started', 'true')")
+    # В конец очереди уходит тот, кто дежурит, а не первый в очереди
+    roster.record_duty(conn, daily_duty, date)
+    outbox.enqueue(conn, t.channel, f"🧹 Дежурства на сегодня:\nДежурит: {daily_duty}", outbox.DUTY_POST,
+                   key=f"duty:{run_id}:channel", failure_note="❌ Ошибка")
+    outbox.enqueue(conn, user_id, "🧹 Вы дежурный сегодня! Не забудьте отчитаться.",
+                   key=f"duty:{run_id}:student", failure_note=f"⚠️ Не удалось оповестить {daily_duty}")
+    outbox.enqueue(conn, t.teacher_id, f"✅ Дежурный назначен: <b>{daily_duty}</b>",
+                   key=f"duty:{run_id}:teacher", priority=TEACHER, parse_mode="HTML")
+
+# === Архив посещаемости ===
+# Раз в сутки закрытые месяцы сворачиваются в архив (обычно ничего не делает)
+async def compact_attendance():
+    first_day = tenant().calendar.today()[:7] + "-01"
+    folded = await tenant().db.transaction(attendance.compact, first_day)
+    if folded:
+        tenant().reports.clear()
 
 # === Планировщик ===
-async def run_scheduler():
-    while True:
-        if bot_active:
-            now = datetime.now()
-            hour_local = (now.hour + TEACHER_TIMEZONE_OFFSET) % 24
-            minute, second = now.minute, now.second
+DUTY_HOUR, DUTY_MINUTE = 8, 25
+COMPACT_HOUR, COMPACT_MINUTE = 3, 0
+
+class SettingsJobStore:
+    # Время последнего запуска задач хранится в таблице settings своего класса.
+    # Имя задачи: "<класс>/<задача>"
+    async def get(self, name: str):
+        tenant_id, job = name.split("/", 1)
+        row = await registry.get(tenant_id).db.fetchone("SELECT value FROM settings WHERE key=?", (f"job_last_run:{job}",))
+        return datetime.fromisoformat(row[0]) if row else None
+
+    async def set(self, name: str, when: datetime):
+        tenant_id, job = name.split("/", 1)
+        await registry.get(tenant_id).db.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (f"job_last_run:{job}", when.isoformat())
+        )
 
-            if not is_weekend():
-                if hour_local == 8 and minute == 25 and second < 10:
-                    await assign_daily_duty()
-                    await asyncio.sleep(60)
-        await asyncio.sleep(10)
+scheduler = Scheduler(SettingsJobStore())
+
+metrics.metrics.gauge("bot_scheduler_lag_seconds", lambda: {(("job", name),): lag for name, lag in scheduler.lag.items()})
+metrics.metrics.gauge("bot_fsm_cache_hit_rate", lambda: {(): fsm_storage.stats()["hit_rate"]})
+metrics.metrics.gauge("bot_jobs_running", lambda: {(): len(background)})
+metrics.metrics.gauge("bot_send_queue_depth", lambda: {(): sender.pending()})
+metrics.metrics.counter("bot_updates_dropped_total", lambda: {(): update_order.dropped})
+metrics.metrics.counter("bot_messages_sent_total", lambda: {(): sender.sent})
+metrics.metrics.counter("bot_messages_failed_total", lambda: {(): sender.failed})
+metrics.metrics.counter("bot_messages_retried_total", lambda: {(): sender.retried})
+metrics.metrics.counter("bot_outbox_delivered_total", lambda: {(): outbox_dispatcher.delivered})
+metrics.metrics.counter("bot_outbox_failed_total", lambda: {(): outbox_dispatcher.failed})
+metrics.metrics.counter("bot_channel_edits_coalesced_total", lambda: {(): message_sync.coalesced})
+metrics.metrics.counter("bot_channel_edits_skipped_total", lambda: {(): message_sync.skipped})
+metrics.metrics.counter("bot_fsm_evicted_total", lambda: {(): fsm_storage.evicted})
+metrics.metrics.counter("bot_jobs_deduplicated_total", lambda: {(): background.deduplicated})
+
+CACHE_NAMES = {"users": "справочник пользователей", "reports": "отчёты", "fsm": "состояния диалогов"}
+
+def cache_stats():
+    # [(метки, статистика)] всех кэшей процесса: справочники и отчёты классов, FSM
+    rows = []
+    for t in registry:
+        rows.append(((("cache", "users"), ("tenant", t.id)), t.users.stats()))
+        rows.append(((("cache", "reports"), ("tenant", t.id)), t.reports.stats()))
+    rows.append(((("cache", "fsm"),), fsm_storage.stats()))
+    return rows
+
+def _cache_field(field: str):
+    return lambda: {labels: stats[field] for labels, stats in cache_stats()}
+
+metrics.metrics.gauge("bot_cache_entries", _cache_field("size"))
+metrics.metrics.counter("bot_cache_hits_total", _cache_field("hits"))
+metrics.metrics.counter("bot_cache_misses_total", _cache_field("misses"))
+
+def for_tenant(t, func):
+    async def run():
+        tenants.use(t)
+        await func()
+    return run
+
+async def run_scheduler():
+    for t in registry:
+        job = DailyJob(f"{t.id}/daily_duty", for_tenant(t, assign_daily_duty), DUTY_HOUR, DUTY_MINUTE, t.calendar.tz_offset)
+        await scheduler.add(job)
+        job = DailyJob(f"{t.id}/compact", for_tenant(t, compact_attendance), COMPACT_HOUR, COMPACT_MINUTE, t.calendar.tz_offset)
+        await scheduler.add(job)
+    await scheduler.run()
 
 # === /start ===
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
 
-    if user_id == TEACHER_ID:
-        cursor.execute("INSERT OR IGNORE INTO users (user_id, name, role, approved) VALUES (?, 'Классный руководитель', 'teacher', 1)", (user_id,))
-        conn.commit()
+    if tenant().is_teacher(user_id):
+        if not tenant().users.get(user_id):
+            await tenant().db.execute("INSERT OR IGNORE INTO users (user_id, name, role, approved) VALUES (?, 'Классный руководитель', 'teacher', 1)", (user_id,))
+            tenant().users.add_if_missing(user_id, "Классный руководитель", "teacher", 1)
         await message.answer("👨‍🏫 Добро пожаловать!", reply_markup=get_teacher_kb())
         return
 
-    cursor.execute("SELECT role, approved FROM users WHERE user_id=?", (user_id,))
-    result = cursor.fetchone()
+    record = tenant().users.get(user_id)
 
-    if result:
-        role, approved = result
+    if record:
+        role, approved = record.role, record.approved
         if role == "student":
             kb = get_student_kb() if approved else None
             await message.answer(
@@ -328,115 +463,128 @@ async def cmd_start(message: types.Message, state: FSMContext):
             )
         return
 
+    registry.bind(user_id, tenant())
     await message.answer("👋 Введите имя (например: Иван Иванов):")
     await state.set_state(Registration.awaiting_name)
 
 # === Регистрация имени ===
 @dp.message(Registration.awaiting_name)
 async def process_name(message: types.Message, state: FSMContext):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен. Ожидайте.")
         await state.clear()
         return
 
     name = message.text.strip()
-    if not re.fullmatch(r"^[А-ЯЁ][а-яё]+(?: [А-ЯЁ][а-яё]+)+$", name, re.IGNORECASE):
+    if not onboarding.is_valid_name(name):
         await message.answer("📛 Имя: две части, кириллица. Пример: Анна Петрова")
         return
 
     user_id = message.from_user.id
-    cursor.execute("INSERT OR REPLACE INTO users (user_id, name, role, approved) VALUES (?, ?, 'student', 0)", (user_id, name))
-    conn.commit()
-
-    await bot.send_message(
-        TEACHER_ID,
-        f"🆕 Заявка:\nИмя: {name}\nЮзер: @{message.from_user.username or 'нет'}",
-        reply_markup=get_approval_kb(user_id)
+    # Имя из списка класса (/import) только помечается: принимает учитель
+    # Уведомление учителю уходит через outbox: его чат ограничен 1 сообщением
+    # в секунду, и обработчик не должен ждать своей очереди
+    await tenant().db.transaction(
+        onboarding.register, user_id, name, tenant().teacher_id,
+        f"🆕 Заявка:\nИмя: {name}\nЮзер: @{message.from_user.username or 'нет'}", get_approval_kb(user_id)
     )
+    tenant().users.put(user_id, name, "student", 0)
+    tenant().reports.clear()
+    outbox_dispatcher.wake(tenant())
     await message.answer("📨 Заявка отправлена.")
     await state.clear()
 
 # === Одобрение / Отклонение ===
 @dp.callback_query(F.data.startswith("approve_"))
 async def approve_student(callback: types.CallbackQuery):
-    if not bot_active:
+    if not tenant().active:
         await callback.answer("🔴 Бот остановлен.", show_alert=True)
         return
     user_id = int(callback.data.split("_")[1])
-    cursor.execute("UPDATE users SET approved=1 WHERE user_id=?", (user_id,))
-    conn.commit()
+    text = callback.message.text
 
-    cursor.execute("SELECT name FROM users WHERE user_id=?", (user_id,))
-    row = cursor.fetchone()
-    if not row:
-        await callback.answer("Ошибка")
-        return
-    name = row[0]
+    async def work(job):
+        today = tenant().calendar.today()
+        row = await tenant().db.transaction(_approve_student_rows, user_id, today, get_student_kb())
+        tenant().reports.clear()
+        if not row:
+            await job.progress(f"{text}\n\n❌ Заявка не найдена.", final=True)
+            return
+        tenant().users.approve(user_id)
+
+        rotation_started = await load_setting("rotation_started", "false")
+        if rotation_started == "false" and len(await sort_duty_roster()) > 1:
+            notify_teacher("📋 Список дежурных отсортирован по алфавиту.")
 
-    add_to_duty_roster(name)
+        outbox_dispatcher.wake(tenant())
+        await job.progress(f"{text}\n\n✅ Принято.", final=True)
 
-    rotation_started = load_setting("rotation_started", "false")
-    if rotation_started == "false" and len(get_duty_list()) > 1:
-        sorted_names = sorted(get_duty_list())
-        clear_duty_roster()
-        for n in sorted_names:
-            add_to_duty_roster(n)
-        await bot.send_message(TEACHER_ID, "📋 Список дежурных отсортирован по алфавиту.")
+    await run_in_background(callback, "approve", work, "Принято")
+
+@dp.callback_query(F.data == "bulk_approve")
+async def bulk_approve(callback: types.CallbackQuery):
+    if not tenant().active:
+        await callback.answer("🔴 Бот остановлен.", show_alert=True)
+        return
+    text = callback.message.text
 
-    today = datetime.now().strftime("%Y-%m-%d")
-    set_absent_from_date(user_id, today, "болезнь")
-    clear_future_absent_from(user_id, today)
+    async def work(job):
+        await job.progress(f"{text}\n\n⏳ Принимаю заявки…", final=True)
+        count, summary = await approve_all_pending(job.id)
+        await track_delivery(job, count, f"{text}\n\n{summary}")
 
-    await bot.send_message(user_id, "✅ Вы приняты! Вы в списке дежурных.", reply_markup=get_student_kb())
-    await callback.message.edit_text(f"{callback.message.text}\n\n✅ Принято.")
-    await callback.answer("Принято")
+    await run_in_background(callback, "bulk_approve", work, "Принимаю…")
 
 @dp.callback_query(F.data.startswith("decline_"))
 async def decline_student(callback: types.CallbackQuery):
-    if not bot_active:
+    if not tenant().active:
         await callback.answer("🔴 Бот остановлен.", show_alert=True)
         return
     user_id = int(callback.data.split("_")[1])
-    cursor.execute("DELETE FROM users WHERE user_id=?", (user_id,))
-    conn.commit()
-    await bot.send_message(user_id, "❌ Ваша заявка отклонена.")
-    await callback.message.edit_text(f"{callback.message.text}\n\n❌ Отклонено.")
+    await tenant().db.transaction(_decline_student_rows, user_id)
+    tenant().users.remove(user_id)
+    tenant().reports.clear()
+    registry.unbind(user_id)
+    outbox_dispatcher.wake(tenant())
+    edit_callback_message(callback, f"{callback.message.text}\n\n❌ Отклонено.")
     await callback.answer("Отклонено")
 
 # === Учитель: Команды ===
 
+async def build_class_list(today_str: str):
+    report_lines = tenant().reports.get("class_list", today_str)
+    if report_lines is not None:
+        return report_lines
+    generation = tenant().reports.generation
+
+    rows = await attendance.roster_with_status(tenant().db, today_str)
+    report_lines = ["👥 Список класса:\n"] if rows else []
+
+    for _, name, status, reason in rows:
+        if status == "present":
+            line = f"{name} — ✅ идёт"
+        else:
+            reason_text = reason if reason else "не указана"
+            line = f"{name} — ❌ не идёт ({reason_text})"
+        report_lines.append(line)
+    return tenant().reports.put("class_list", today_str, report_lines, generation)
+
+
 @dp.message(F.text == "📋 Список класса")
 async def list_students(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         return
 
-    cursor.execute("SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC")
-    students = cursor.fetchall()
+    today_str = tenant().calendar.today()
+    report_lines = await build_class_list(today_str)
 
-    if not students:
+    if not report_lines:
         await message.answer("📚 Класс пуст.")
         return
 
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    report_lines = ["👥 Список класса:\n"]
-
-    for user_id, name in students:
-        cursor.execute("SELECT status, reason FROM attendance WHERE user_id=? AND date=?", (user_id, today_str))
-        row = cursor.fetchone()
-        if row:
-            status, reason = row
-            if status == "present":
-                line = f"{name} — ✅ идёт"
-            else:
-                reason_text = reason if reason else "не указана"
-                line = f"{name} — ❌ не идёт ({reason_text})"
-        else:
-            line = f"{name} — ✅ идёт"  # по умолчанию
-        report_lines.append(line)
-
     full_report = "\n".join(report_lines)
     if len(full_report) > 4096:
         for i in range(0, len(report_lines), 25):
@@ -447,54 +595,47 @@ async def list_students(message: types.Message):
         await message.answer(full_report)
 
 
+async def build_status_report(today_str: str) -> str:
+    report = tenant().reports.get("status", today_str)
+    if report is not None:
+        return report
+    generation = tenant().reports.generation
+
+    rows = await attendance.roster_with_status(tenant().db, today_str)
+    present = [name for _, name, status, _ in rows if status == "present"]
+    absent = [f"{name} ({reason})" for _, name, status, reason in rows if status != "present"]
+
+    report = ""
+    if present or absent:
+        report = "📋 Кто сегодня:\n"
+        if present:
+            report += "\n✅ Идут:\n" + "\n".join([f"• {name}" for name in present])
+        if absent:
+            report += "\n❌ Не идут:\n" + "\n".join([f"• {item}" for item in absent])
+    return tenant().reports.put("status", today_str, report, generation)
+
+
 @dp.message(Command("status"))
 async def cmd_status(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    cursor.execute("SELECT name FROM users WHERE user_id IN (SELECT user_id FROM attendance WHERE date=? AND status='present') AND role='student' AND approved=1", (today_str,))
-    present = [row[0] for row in cursor.fetchall()]
-    cursor.execute("SELECT name, reason FROM users LEFT JOIN attendance ON users.user_id = attendance.user_id AND attendance.date=? WHERE attendance.status='absent' AND users.role='student' AND users.approved=1", (today_str,))
-    absent_rows = cursor.fetchall()
-    absent = [f"{name} ({reason})" for name, reason in absent_rows]
+    today_str = tenant().calendar.today()
+    report = await build_status_report(today_str)
 
-    if not present and not absent:
+    if not report:
         await message.answer("🚫 Нет данных.")
         return
 
-    report = "📋 Кто сегодня:\n"
-    if present:
-        report += "\n✅ Идут:\n" + "\n".join([f"• {name}" for name in present])
-    if absent:
-        report += "\n❌ Не идут:\n" + "\n".join([f"• {item}" for item in absent])
-
     await message.answer(report)
 
 
-@dp.message(F.text == "📊 Посещаемость")
-@dp.message(Command("attendance"))
-async def cmd_attendance(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
-        return
-
-    dates = get_dates_in_month()
-    month_name = datetime.now().strftime("%B %Y")
-
-    cursor.execute("SELECT user_id, name FROM users WHERE role='student' AND approved=1 ORDER BY name ASC")
-    students = cursor.fetchall()
-
-    if not students:
-        await message.answer("📚 Нет учеников.")
-        return
-
+def render_attendance_lines(matrix, month_name: str):
+    days = [date.split("-")[2] for date in matrix.dates]
     report_lines = [f"📋 Посещаемость за {month_name}\n"]
 
-    for user_id, name in students:
-        att = get_attendance_for_user(user_id)
+    for user_id, name in matrix.students:
         day_icons = []
-        for date in dates:
-            status, reason = att[date]
-            day = date.split("-")[2]
+        for day, (status, reason) in zip(days, matrix.row(user_id)):
             if status == "present":
                 day_icons.append(f"{day}✅")
             else:
@@ -504,6 +645,35 @@ async def cmd_attendance(message: types.Message):
         if len(line) > 100:
             line = line[:97] + "..."
         report_lines.append(line)
+    return report_lines
+
+
+async def build_attendance_report(now: datetime):
+    month = now.strftime("%Y-%m")
+    report_lines = tenant().reports.get("attendance", month)
+    if report_lines is not None:
+        return report_lines
+    generation = tenant().reports.generation
+
+    matrix = await attendance.month_matrix(tenant().db, get_dates_in_month())
+    if matrix.students and not matrix.dates:
+        report_lines = [f"📋 Посещаемость за {now.strftime('%B %Y')}\n", "Учебных дней в этом месяце нет."]
+    else:
+        report_lines = render_attendance_lines(matrix, now.strftime("%B %Y")) if matrix.students else []
+    return tenant().reports.put("attendance", month, report_lines, generation)
+
+
+@dp.message(F.text == "📊 Посещаемость")
+@dp.message(Command("attendance"))
+async def cmd_attendance(message: types.Message):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+
+    report_lines = await build_attendance_report(tenant().calendar.now())
+
+    if not report_lines:
+        await message.answer("📚 Нет учеников.")
+        return
 
     full_report = "\n".join(report_lines)
 
@@ -517,11 +687,99 @@ async def cmd_attendance(message: types.Message):
         await message.answer(full_report)
 
 
+# === Статистика за учебный год ===
+WEEKDAY_NAMES = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+async def build_stats_report(now: datetime) -> str:
+    today_str = now.strftime("%Y-%m-%d")
+    report = tenant().reports.get("stats", today_str)
+    if report is not None:
+        return report
+    generation = tenant().reports.generation
+
+    cal = tenant().calendar
+    dates = cal.working_days(cal.term_start(today_str), today_str)
+    if not dates:
+        return tenant().reports.put("stats", today_str, "", generation)
+    term = await analytics.load_term(tenant().db, dates)
+    if not term.students:
+        return tenant().reports.put("stats", today_str, "", generation)
+
+    rates = term.attendance_rates()
+    streaks = term.longest_streaks()
+    by_weekday = term.weekday_absence()
+    lines = [
+        f"📈 Статистика с {dates[0][8:10]}.{dates[0][5:7]}.{dates[0][:4]} ({len(dates)} уч. дн.)\n",
+        f"Посещаемость класса: {rates.mean():.1%}",
+        "Пропуски по дням: " + " · ".join(
+            f"{WEEKDAY_NAMES[day]} {by_weekday[day]:.0%}" for day in sorted(set(term.weekdays.tolist()))
+        ),
+    ]
+    chronic = term.chronic()
+    lines.append(f"\n⚠️ Пропускают {analytics.CHRONIC_THRESHOLD:.0%} и больше:")
+    lines += [f"{name} — {rate:.0%}" for name, rate in chronic] or ["нет"]
+    longest = [i for i in streaks.argsort(kind="stable")[::-1][:5] if streaks[i] > 1]
+    if longest:
+        lines.append("\n🔁 Самые длинные серии пропусков:")
+        lines += [f"{term.students[i][1]} — {streaks[i]} дн." for i in longest]
+    return tenant().reports.put("stats", today_str, "\n".join(lines), generation)
+
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: types.Message):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+    report = await build_stats_report(tenant().calendar.now())
+    await message.answer(report or "📚 Нет учеников.")
+
+
+@dp.message(Command("perf"))
+async def cmd_perf(message: types.Message):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+    m = metrics.metrics
+    lines = ["⏱ Производительность с момента запуска (p50 / p99, мс):"]
+
+    def row(name, histogram, scale=1000):
+        return f"{name} — {histogram.quantile(0.5) * scale:g} / {histogram.quantile(0.99) * scale:g} ({histogram.count})"
+
+    update = m.histogram("bot_update_seconds")
+    if update:
+        lines.append(row("Обновление целиком", update))
+        lines.append(row("SQL-операторов на обновление", m.histogram("bot_update_sql_statements"), 1))
+    handlers = sorted(m.by_label("bot_handler_seconds", "handler").items(), key=lambda item: -item[1].quantile(0.99))
+    if handlers:
+        lines.append("\n🧩 Обработчики (самые медленные):")
+        lines += [row(name, h) for name, h in handlers[:10]]
+    api = m.by_label("bot_api_seconds", "method")
+    if api:
+        lines.append("\n📡 Bot API:")
+        lines += [row(name, h) for name, h in sorted(api.items())]
+    errors = {dict(labels)["handler"]: value for (name, labels), value in m.counters.items() if name == "bot_handler_errors_total"}
+    if errors:
+        lines.append("\n❗ Ошибки: " + ", ".join(f"{name} — {count}" for name, count in sorted(errors.items())))
+    if scheduler.lag:
+        lines.append("\n⏰ Опоздание задач: " + ", ".join(f"{name} — {lag:.1f} с" for name, lag in sorted(scheduler.lag.items())))
+    totals = {}
+    for labels, stats in cache_stats():
+        total = totals.setdefault(dict(labels)["cache"], [0, 0, 0])
+        total[0] += stats["size"]
+        total[1] += stats["hits"]
+        total[2] += stats["misses"]
+    lines.append("\n🗂 Кэши (записей, попаданий):")
+    lines += [
+        f"{CACHE_NAMES[cache]} — {size}, {hits / (hits + misses) if hits + misses else 0:.0%}"
+        for cache, (size, hits, misses) in totals.items()
+    ]
+    lines.append(f"\n📤 Отправлено: {sender.sent}, ошибок: {sender.failed}, отброшено обновлений: {update_order.dropped}")
+    await message.answer("\n".join(lines))
+
+
 @dp.message(F.text == "➕ Добавить дежурного")
 async def prompt_duty_name(message: types.Message, state: FSMContext):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         return
     await message.answer("✏️ Введите имя нового дежурного:")
@@ -530,49 +788,37 @@ async def prompt_duty_name(message: types.Message, state: FSMContext):
 
 @dp.message(Registration.awaiting_duty_name)
 async def set_duty(message: types.Message, state: FSMContext):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         await state.clear()
         return
 
     name = message.text.strip()
-    cursor.execute("SELECT user_id FROM users WHERE name=? AND approved=1", (name,))
-    row = cursor.fetchone()
+    record = tenant().users.by_name(name, approved=True)
 
-    if not row:
+    if not record:
         await message.answer("❌ Ученик не найден.")
         await state.clear()
         return
 
-    user_id = row[0]
-    msg_text = f"🧹 Дежурства на сегодня:\nДежурит: {name}"
-
-    msg_id = get_duty_message_id()
-    try:
-        if msg_id:
-            await bot.edit_message_text(
-                chat_id=current_channel,
-                message_id=msg_id,
-                text=msg_text
-            )
-        else:
-            sent = await bot.send_message(current_channel, msg_text)
-            save_duty_message_id(sent.message_id)
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"⚠️ Не удалось обновить канал: {e}")
-
-    try:
-        await bot.send_message(user_id, "🧹 Вам назначен статус дежурного! Не забудьте отчитаться.")
-    except Exception as e:
-        await bot.send_message(TEACHER_ID, f"⚠️ Не удалось оповестить {name}: {e}")
+    user_id = record.user_id
+    await tenant().db.transaction(_set_duty_rows, tenant(), name, user_id)
+    outbox_dispatcher.wake(tenant())
 
     await message.answer(f"✅ Дежурный назначен: <b>{name}</b>", parse_mode="HTML")
     await state.clear()
 
 
+def _set_duty_rows(conn, t, name: str, user_id: int):
+    outbox.enqueue(conn, t.channel, f"🧹 Дежурства на сегодня:\nДежурит: {name}", outbox.DUTY_EDIT,
+                   failure_note="⚠️ Не удалось обновить канал")
+    outbox.enqueue(conn, user_id, "🧹 Вам назначен статус дежурного! Не забудьте отчитаться.",
+                   failure_note=f"⚠️ Не удалось оповестить {name}")
+
+
 @dp.message(Command("set_channel"))
 async def set_channel(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
 
     args = message.text.split(maxsplit=1)
@@ -597,26 +843,77 @@ async def set_channel(message: types.Message):
         await message.answer("📛 Некорректная ссылка. Должно быть: <code>@username</code> или <code>https://t.me/+...</code>", parse_mode="HTML")
         return
 
-    global current_channel
-    current_channel = new_channel
-    save_setting("channel", current_channel)
+    tenant().channel = new_channel
+    await save_setting("channel", tenant().channel)
 
     channel_type = "private" if "t.me/+" in new_channel else "public"
-    save_setting("channel_type", channel_type)
+    await save_setting("channel_type", channel_type)
 
     await message.answer(
-        f"✅ Канал изменён:\n\n<b>{current_channel}</b>\n\n"
+        f"✅ Канал изменён:\n\n<b>{tenant().channel}</b>\n\n"
         "🤖 Теперь добавьте этого бота как администратора в канал.\n"
         "После этого он сможет публиковать отчёты.",
         parse_mode="HTML"
     )
 
 
+@dp.message(Command("invite"))
+async def cmd_invite(message: types.Message):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+    me = await bot.get_me()
+    await message.answer(
+        f"🔗 Ссылка для регистрации учеников:\nhttps://t.me/{me.username}?start={tenant().id}"
+    )
+
+
+@dp.message(Command("import"))
+async def cmd_import(message: types.Message, state: FSMContext, command: CommandObject):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+    if not tenant().active:
+        await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
+        return
+    if command.args:
+        await message.answer(await import_class_list(command.args))
+        return
+    await message.answer("📥 Пришлите список класса: по одному «Имя Фамилия» в строке или CSV-файл.")
+    await state.set_state(Registration.awaiting_import)
+
+
+@dp.message(Registration.awaiting_import)
+async def receive_import(message: types.Message, state: FSMContext):
+    await state.clear()
+    if message.document:
+        if (message.document.file_size or 0) > IMPORT_MAX_FILE:
+            await message.answer("❌ Файл слишком большой.")
+            return
+        raw = (await bot.download(message.document)).read()
+        try:
+            text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = raw.decode("cp1251")  # CSV из Excel
+    else:
+        text = message.text or ""
+    await message.answer(await import_class_list(text))
+
+
+@dp.message(Command("approve_all"))
+async def cmd_approve_all(message: types.Message):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+    if not tenant().active:
+        await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
+        return
+    _, summary = await approve_all_pending()
+    await message.answer(summary)
+
+
 @dp.message(F.text == "🗑️ Удалить ученика")
 async def prompt_delete_name(message: types.Message, state: FSMContext):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         return
     await message.answer("✏️ Введите имя или <code>@all</code>:", parse_mode="HTML")
@@ -625,7 +922,7 @@ async def prompt_delete_name(message: types.Message, state: FSMContext):
 
 @dp.message(Registration.awaiting_delete_name)
 async def delete_student(message: types.Message, state: FSMContext):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         await state.clear()
         return
@@ -634,80 +931,77 @@ async def delete_student(message: types.Message, state: FSMContext):
         await message.answer("⚠️ Точно удалить всех?", reply_markup=get_confirm_kb(), parse_mode="HTML")
         await state.set_state(Registration.awaiting_delete_confirm)
     else:
-        cursor.execute("SELECT user_id FROM users WHERE name=? AND role='student'", (name,))
-        row = cursor.fetchone()
-        if row:
-            user_id = row[0]
-            try:
-                await bot.send_message(user_id, "🚫 Вы удалены из класса.", reply_markup=types.ReplyKeyboardRemove())
-            except Exception as e:
-                print(f"[Ошибка] {e}")
-            cursor.execute("DELETE FROM users WHERE name=? AND role='student'", (name,))
-            remove_from_duty_roster(name)
-            cursor.execute("DELETE FROM attendance WHERE user_id=?", (user_id,))
-            conn.commit()
-        await message.answer(f"✅ Удалён: {name}" if cursor.rowcount else "❌ Не найден.")
+        record = tenant().users.by_name(name, role="student")
+        deleted = 0
+        if record:
+            user_id = record.user_id
+            deleted = await tenant().db.transaction(_delete_student_rows, user_id, name)
+            tenant().users.remove_by_name(name, "student")
+            tenant().reports.clear()
+            registry.unbind(user_id)
+            outbox_dispatcher.wake(tenant())
+        else:
+            # Имя из списка класса, под которым никто не зарегистрировался
+            deleted = await tenant().db.transaction(onboarding.forget, name)
+        await message.answer(f"✅ Удалён: {name}" if deleted else "❌ Не найден.")
         await state.clear()
 
 
 @dp.callback_query(F.data == "confirm_delete_all")
 async def confirm_delete_all(callback: types.CallbackQuery, state: FSMContext):
-    cursor.execute("SELECT user_id FROM users WHERE role='student'")
-    students = cursor.fetchall()
-    cursor.execute("DELETE FROM users WHERE role='student'")
-    clear_duty_roster()
-    cursor.execute("DELETE FROM attendance")
-    conn.commit()
-    for (user_id,) in students:
-        try:
-            await bot.send_message(user_id, "🚫 Все данные сброшены.", reply_markup=types.ReplyKeyboardRemove())
-        except Exception as e:
-            print(f"[Ошибка] {e}")
-    await callback.message.edit_text("✅ Все ученики и данные удалены.")
-    await callback.answer("Готово")
     await state.clear()
 
+    async def work(job):
+        await job.progress("⏳ Удаляю учеников и данные…", final=True)
+        students = await tenant().db.transaction(_delete_all_students_rows, job.id)
+        tenant().users.remove_students()
+        tenant().reports.clear()
+        for (user_id,) in students:
+            registry.unbind(user_id)
+        outbox_dispatcher.wake(tenant())
+        await track_delivery(job, len(students), "✅ Все ученики и данные удалены.")
+
+    await run_in_background(callback, "delete_all", work, "Удаляю…")
+
 
 @dp.callback_query(F.data == "cancel_delete")
 async def cancel_delete(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("❌ Отменено")
+    edit_callback_message(callback, "❌ Отменено")
     await callback.answer("Отмена")
     await state.clear()
 
 
 @dp.message(F.text == "📤 Повторить отчёт в канал")
 async def resend_channel_report(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
         return
-    await assign_daily_duty()
+    await assign_daily_duty(run_id=uuid.uuid4().hex)
     await message.answer("📤 Запрос отправлен.")
 
 
 @dp.message(F.text == "🔴 Стоп")
 async def stop_bot(message: types.Message):
-    global bot_active
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    bot_active = False
+    tenant().active = False
     await message.answer("🔴 Бот остановлен.", reply_markup=get_teacher_kb())
 
 
 @dp.message(F.text == "🟢 Старт")
 async def start_bot(message: types.Message):
-    global bot_active
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    bot_active = True
+    tenant().active = True
     await message.answer("🟢 Бот запущен.", reply_markup=get_teacher_kb())
 
 
 @dp.message(Command("help"))
 @dp.message(F.text == "ℹ️ Помощь")
 async def teacher_help(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
     help_text = """
 👨‍🏫 <b>Помощь</b>
@@ -716,7 +1010,14 @@ async def teacher_help(message: types.Message):
 /attendance — посещаемость  
 /status — кто сегодня идёт  
 /reset_duty_list — сброс очереди  
+/next_duty — следующий дежурный  
+/duty_plan — план дежурств на неделю  
+/stats — статистика посещаемости за учебный год  
+/perf — задержки и нагрузка бота  
 /set_channel — изменить канал (работает с приватными)  
+/invite — ссылка для регистрации учеников  
+/import — загрузить список класса (текст или CSV)  
+/approve_all — принять все ожидающие заявки  
 /help — это сообщение
 
 Кнопки:
@@ -735,52 +1036,71 @@ async def teacher_help(message: types.Message):
 
 @dp.message(Command("reset_duty_list"))
 async def cmd_reset_duty_list(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    names = get_duty_list()
+    names = await get_duty_list()
     if not names:
         await message.answer("📋 Список пуст.")
         return
-    sorted_names = sorted(names)
-    clear_duty_roster()
-    for name in sorted_names:
-        add_to_duty_roster(name)
-    save_setting("rotation_started", "false")
+    sorted_names = await sort_duty_roster()
+    await save_setting("rotation_started", "false")
     numbered = "\n".join([f"{i+1}. {name}" for i, name in enumerate(sorted_names)])
     await message.answer(f"✅ Список сброшен к алфавиту:\n\n{numbered}")
 
 
 @dp.message(Command("next_duty"))
 async def cmd_next_duty(message: types.Message):
-    if message.from_user.id != TEACHER_ID:
+    if not tenant().is_teacher(message.from_user.id):
         return
-    names = get_duty_list()
-    if not names:
+    engine = await duty_engine()
+    if not len(engine):
         await message.answer("📋 Список дежурных пуст.")
         return
-    next_name = names[0]
-    cursor.execute("SELECT status FROM attendance WHERE user_id=(SELECT user_id FROM users WHERE name=?) AND date=?", (next_name, datetime.now().strftime("%Y-%m-%d")))
-    row = cursor.fetchone()
-    status_text = " ✅ придёт" if row and row[0] == "present" else " ❌ не придёт"
+    today_str = tenant().calendar.today()
+    next_name = engine.pick(set(await get_duty_list()), today_str).name
+    rows = await attendance.roster_with_status(tenant().db, today_str, next_name)
+    status_text = " ✅ придёт" if rows and rows[0][2] == "present" else " ❌ не придёт"
     await message.answer(f"➡️ Следующий: <b>{next_name}</b>{status_text}", parse_mode="HTML")
 
 
+@dp.message(Command("duty_plan"))
+async def cmd_duty_plan(message: types.Message):
+    if not tenant().is_teacher(message.from_user.id):
+        return
+    engine = await duty_engine()
+    if not len(engine):
+        await message.answer("📋 Список дежурных пуст.")
+        return
+    # Учебные дни на неделю вперёд; присутствие — по уже известным отсутствиям
+    dates = tenant().calendar.next_working_days(tenant().calendar.today(), 5)
+    if not dates:
+        await message.answer("📅 Учебных дней впереди нет.")
+        return
+    matrix = await attendance.month_matrix(tenant().db, dates)
+    plan = engine.plan([
+        (date, {name for _, name, status, _ in matrix.column(date) if status == "present"})
+        for date in dates
+    ])
+    lines = [f"{date[8:10]}.{date[5:7]} — {entry.name if entry else 'никто не приходит'}" for date, entry in plan]
+    await message.answer("📅 План дежурств:\n\n" + "\n".join(lines))
+
+
 # === Ученик: Команды ===
 
 @dp.message(F.text == "✅ Приду в школу")
 async def mark_present(message: types.Message):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.")
         return
     user_id = message.from_user.id
-    today = datetime.now().strftime("%Y-%m-%d")
-    clear_future_absent_from(user_id, today)
+    today = tenant().calendar.today()
+    await clear_future_absent_from(user_id, today)
     await message.answer("✅ Вы отметились как 'приду'. Будущие отсутствия отменены.")
 
 
 @dp.message(F.text == "❌ Не приду")
 async def prompt_absent_reason(message: types.Message, state: FSMContext):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.")
         return
     await message.answer("📝 Укажите причину:")
@@ -789,58 +1109,91 @@ async def prompt_absent_reason(message: types.Message, state: FSMContext):
 
 @dp.message(Registration.awaiting_reason)
 async def mark_absent(message: types.Message, state: FSMContext):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.")
         await state.clear()
         return
     reason = message.text.strip()
     user_id = message.from_user.id
-    today = datetime.now().strftime("%Y-%m-%d")
-    set_absent_from_date(user_id, today, reason)
+    today = tenant().calendar.today()
+    await set_absent_from_date(user_id, today, reason)
     await message.answer(f"❌ Вы отмечены как 'не приду'. Причина: {reason}")
     await state.clear()
 
 
 @dp.message(F.text == "🧹 Отчитаться о дежурстве")
 async def report_duty(message: types.Message):
-    if not bot_active:
+    if not tenant().active:
         await message.answer("🔴 Бот остановлен.")
         return
-    cursor.execute("SELECT name FROM users WHERE user_id=?", (message.from_user.id,))
-    row = cursor.fetchone()
-    if not row:
+    record = tenant().users.get(message.from_user.id)
+    if not record:
         await message.answer("❌ Вы не зарегистрированы.")
         return
-    name = row[0]
+    name = record.name
     await message.answer("🧹 Вы отчитались! Молодец! 💪")
 
-    # Редактируем сообщение в канале
-    msg_id = get_duty_message_id()
-    if msg_id:
-        try:
-            await bot.edit_message_text(
-                chat_id=current_channel,
-                message_id=msg_id,
-                text="🧹 Дежурства на сегодня:\nДежурный не назначен"
-            )
-        except Exception as e:
-            print(f"[Ошибка редактирования] {e}")
-
-    # Перемещаем в конец очереди
-    add_to_end_of_duty(name)
+    # Редактируем сообщение в канале и перемещаем в конец очереди
+    await tenant().db.transaction(_report_duty_rows, tenant(), name)
+    outbox_dispatcher.wake(tenant())
+
+def _report_duty_rows(conn, t, name: str):
+    outbox.enqueue(conn, t.channel, "🧹 Дежурства на сегодня:\nДежурный не назначен", outbox.DUTY_EDIT, edit_only=True)
+    roster.move_to_end(conn, name)
+
+
+# === WEBHOOK ===
+# Если в config.py задан WEBHOOK_URL, бот принимает обновления через
+# встроенный HTTP-сервер вместо long polling.
+WEBHOOK_URL = getattr(config, "WEBHOOK_URL", None)
+WEBHOOK_SECRET = getattr(config, "WEBHOOK_SECRET", "")
+WEBHOOK_HOST = getattr(config, "WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = getattr(config, "WEBHOOK_PORT", 8080)
+WEBHOOK_PATH = getattr(config, "WEBHOOK_PATH", "/webhook")
+WEBHOOK_QUEUE_SIZE = getattr(config, "WEBHOOK_QUEUE_SIZE", 1000)
+
+async def run_webhook():
+    server = WebhookServer(dp, bot, WEBHOOK_SECRET, WEBHOOK_PATH, WEBHOOK_QUEUE_SIZE)
+    # Отказы и переполнение очереди — сигнал обратного давления
+    metrics.metrics.gauge("bot_webhook_queue_depth", lambda: {(): server.queue.qsize()})
+    metrics.metrics.counter("bot_webhook_accepted_total", lambda: {(): server.accepted})
+    metrics.metrics.counter("bot_webhook_rejected_total", lambda: {(): server.rejected})
+    metrics.metrics.counter("bot_webhook_dropped_total", lambda: {(): server.dropped})
+    await server.start(WEBHOOK_HOST, WEBHOOK_PORT)
+    await bot.set_webhook(
+        WEBHOOK_URL, secret_token=WEBHOOK_SECRET, allowed_updates=dp.resolve_used_update_types()
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
 
 
 # === ЗАПУСК БОТА ===
 async def main():
-    # Подгружаем текущий канал из БД
-    global current_channel
-    current_channel = load_setting("channel", CHANNEL_ID)
-    
+    if WEBHOOK_URL:
+        check_secret(WEBHOOK_SECRET)
+
     # Запускаем планировщик
     asyncio.create_task(run_scheduler())
     
-    # Стартуем опрос бота
-    await dp.start_polling(bot)
+    sender.start()
+    asyncio.create_task(outbox_dispatcher.run())
+    asyncio.create_task(fsm_storage.run())
+    metrics_server = await metrics.start_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+    try:
+        if WEBHOOK_URL:
+            await run_webhook()
+        else:
+            # Стартуем опрос бота (webhook, если был задан раньше, снимаем)
+            await bot.delete_webhook()
+            await dp.start_polling(bot, handle_as_tasks=True)
+    finally:
+        if metrics_server:
+            await metrics_server.cleanup()
+        await sender.stop()
+        await fsm_storage.close()
+        registry.close_all()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+# metrics.py
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+
+# === МЕТРИКИ ===
+# Гистограммы задержек обработчиков и запросов к Bot API, число и время
+# SQL-операторов на обновление, ошибки обработчиков и опоздание задач
+# планировщика. Всё хранится в памяти процесса и отдаётся в текстовом
+# формате Prometheus (GET /metrics) и командой /perf.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # секунды
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)                     # штуки
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя ячейка — +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # Верхняя граница корзины, в которую попадает q-я доля наблюдений
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}  # (имя, метки) -> Histogram
+        self.counters = {}    # (имя, метки) -> число
+        self.gauges = {}      # имя -> (тип, функция, возвращающая {метки: значение})
+
+    def observe(self, name: str, value: float, buckets=BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, read):
+        self.gauges[name] = ("gauge", read)
+
+    def counter(self, name: str, read):
+        # Счётчик, который ведёт сам объект (SendQueue.sent и т. п.): значение только растёт
+        self.gauges[name] = ("counter", read)
+
+    def histogram(self, name: str, **labels):
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def by_label(self, name: str, label: str) -> dict:
+        return {dict(labels)[label]: h for (n, labels), h in self.histograms.items() if n == name}
+
+    # --- Текстовый формат Prometheus ---
+    def render(self) -> str:
+        lines = []
+        typed = set()
+
+        def declare(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for name, (kind, read) in sorted(self.gauges.items()):
+            declare(name, kind)
+            for labels, value in read().items():
+                lines.append(f"{name}{_labels(tuple(sorted(labels)))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+metrics = Metrics()
+
+
+# === Учёт SQL внутри одного обновления ===
+# Database вызывает record_sql в контексте того обновления, которое ждёт запрос.
+
+class UpdateStats:
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+current_update: ContextVar[UpdateStats] = ContextVar("current_update")
+
+def record_sql(statements: int, seconds: float):
+    metrics.inc("bot_sql_statements_total", statements)
+    metrics.observe("bot_sql_call_seconds", seconds)
+    stats = current_update.get(None)
+    if stats is not None:
+        stats.statements += statements
+        stats.sql_seconds += seconds
+
+
+# === Middleware ===
+class UpdateMetricsMiddleware(BaseMiddleware):
+    # Внешний: время всего обновления и SQL, который оно вызвало
+    async def __call__(self, handler, event, data: dict):
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            current_update.reset(token)
+            metrics.observe("bot_update_seconds", time.perf_counter() - started)
+            metrics.observe("bot_update_sql_statements", stats.statements, COUNT_BUCKETS)
+            metrics.observe("bot_update_sql_seconds", stats.sql_seconds)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Внутренний: задержка и ошибки конкретного обработчика
+    async def __call__(self, handler, event, data: dict):
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("bot_handler_errors_total", handler=name)
+            raise
+        finally:
+            metrics.observe("bot_handler_seconds", time.perf_counter() - started, handler=name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    # Задержка каждого запроса к Bot API по методу
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            metrics.inc("bot_api_errors_total", method=name)
+            raise
+        finally:
+            metrics.observe("bot_api_seconds", time.perf_counter() - started, method=name)
+
+
+# === HTTP /metrics ===
+async def start_server(host: str, port: int) -> web.AppRunner:
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
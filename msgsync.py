@@ -0,0 +1,72 @@
+# msgsync.py
+import asyncio
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest
+
+
+# === СИНХРОНИЗАЦИЯ РЕДАКТИРУЕМЫХ СООБЩЕНИЙ ===
+# Для каждого (chat_id, message_id) хранится желаемый текст.
+# Все правки, пришедшие за окно debounce, сливаются в одну,
+# а правка на тот же текст, что уже в сообщении, не отправляется вовсе.
+
+NOT_MODIFIED = "message is not modified"
+
+class MessageSync:
+    def __init__(self, sender, debounce: float = 1.5, remember: int = 1024):
+        self.sender = sender
+        self.debounce = debounce
+        self.remember_limit = remember
+        self._desired = {}          # key -> (text, kwargs)
+        self._waiters = {}          # key -> [Future]
+        self._timers = {}           # key -> Task
+        self._applied = OrderedDict()  # key -> текст, который сейчас в сообщении
+        self.edits = 0
+        self.coalesced = 0
+        self.skipped = 0
+
+    def remember(self, chat_id, message_id: int, text: str):
+        key = (chat_id, message_id)
+        self._applied[key] = text
+        self._applied.move_to_end(key)
+        while len(self._applied) > self.remember_limit:
+            self._applied.popitem(last=False)
+
+    async def set_text(self, chat_id, message_id: int, text: str, **kwargs):
+        key = (chat_id, message_id)
+        if key in self._desired:
+            self.coalesced += 1
+        self._desired[key] = (text, kwargs)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+        return await future
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.debounce)
+        del self._timers[key]
+        text, kwargs = self._desired.pop(key)
+        waiters = self._waiters.pop(key)
+        error = None
+        if self._applied.get(key) == text:
+            self.skipped += 1
+        else:
+            chat_id, message_id = key
+            try:
+                await self.sender.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+                self.edits += 1
+            except TelegramBadRequest as e:
+                if NOT_MODIFIED not in str(e):
+                    error = e
+            except Exception as e:
+                error = e
+            if error is None:
+                self.remember(chat_id, message_id, text)
+        for future in waiters:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
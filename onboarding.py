@@ -0,0 +1,107 @@
+# onboarding.py
+import csv
+import io
+import re
+
+import attendance
+import outbox
+import roster
+from sender import BROADCAST, TEACHER
+
+
+# === МАССОВЫЙ ПРИЁМ УЧЕНИКОВ ===
+# Учитель загружает список класса (/import: текст или CSV-файл). Имена
+# становятся «ожидаемыми»: заявка с таким именем помечается для учителя,
+# но принимает её всё равно учитель (список класса не секрет). В очередь
+# дежурных ученик встаёт только после приёма.
+# «Принять всех ожидающих» — одна транзакция: очередь перестраивается
+# один раз, приветствия ставятся в outbox пачкой.
+# Функции с conn выполняются внутри db.transaction.
+
+NAME_RE = re.compile(r"^[А-ЯЁ][а-яё]+(?: [А-ЯЁ][а-яё]+)+$", re.IGNORECASE)
+WELCOME = "✅ Вы приняты! Вы в списке дежурных."
+
+def is_valid_name(name: str) -> bool:
+    return bool(NAME_RE.fullmatch(name))
+
+HEADER_WORDS = {"фио", "имя", "фамилия", "ученик", "класс", "name", "first name", "last name"}
+
+def parse_names(text: str):
+    # Одно имя в строке. В CSV (через «,» или «;») имя — одна из ячеек
+    # или все ячейки через пробел. Если в заголовке есть столбцы «Имя»
+    # и «Фамилия», имя собирается как «Имя Фамилия». Повторы отбрасываются.
+    delimiter = ";" if text.count(";") > text.count(",") else ","
+    valid, invalid, seen = [], [], set()
+    columns = None
+    for cells in csv.reader(io.StringIO(text), delimiter=delimiter):
+        cells = [" ".join(cell.split()) for cell in cells]
+        if not any(cells):
+            continue
+        header = [cell.lower() for cell in cells]
+        if any(cell in HEADER_WORDS for cell in header):
+            if "имя" in header and "фамилия" in header:
+                columns = header.index("имя"), header.index("фамилия")
+            continue
+        if columns and max(columns) < len(cells):
+            candidates = [f"{cells[columns[0]]} {cells[columns[1]]}"]
+        else:
+            cells = [cell for cell in cells if cell]
+            candidates = cells + [" ".join(cells)]
+        name = next((c for c in candidates if is_valid_name(c)), None)
+        if name is None:
+            invalid.append(", ".join(cell for cell in cells if cell))
+        elif name not in seen:
+            seen.add(name)
+            valid.append(name)
+    return valid, invalid
+
+def _rotation_started(conn) -> bool:
+    row = conn.execute("SELECT value FROM settings WHERE key='rotation_started'").fetchone()
+    return bool(row) and row[0] == "true"
+
+def _approve(conn, rows: list, today: str, welcome_markup, batch: str = None):
+    # rows — [(user_id, name)] ещё не принятых учеников; batch — пачка в outbox
+    conn.executemany("UPDATE users SET approved=1 WHERE user_id=?", [(user_id,) for user_id, _ in rows])
+    conn.executemany("DELETE FROM expected_students WHERE name=?", [(name,) for _, name in rows])
+    for user_id, name in rows:
+        attendance.close_absences(conn, user_id, today)
+        roster.append(conn, name)
+        outbox.enqueue(conn, user_id, WELCOME, key=outbox.batch_key(batch, user_id) if batch else None,
+                       priority=BROADCAST, reply_markup=welcome_markup)
+
+def _finish(conn) -> bool:
+    # Пока дежурства не начались, очередь держится по алфавиту
+    if _rotation_started(conn):
+        return False
+    return len(roster.resort(conn)) > 1
+
+def approve_pending(conn, today: str, welcome_markup, batch: str = None):
+    rows = conn.execute("SELECT user_id, name FROM users WHERE role='student' AND approved=0").fetchall()
+    _approve(conn, rows, today, welcome_markup, batch)
+    return rows, _finish(conn) if rows else False
+
+def import_names(conn, names: list):
+    # Имена уже принятых учеников не становятся ожидаемыми.
+    # Возвращает (новых имён, заявок с именами из списка, ждущих приёма)
+    approved = {row[0] for row in conn.execute("SELECT name FROM users WHERE role='student' AND approved=1")}
+    fresh = [(name,) for name in names if name not in approved]
+    added = conn.executemany("INSERT OR IGNORE INTO expected_students (name) VALUES (?)", fresh).rowcount if fresh else 0
+    waiting = conn.execute(
+        "SELECT COUNT(*) FROM users WHERE role='student' AND approved=0 "
+        "AND name IN (SELECT name FROM expected_students)"
+    ).fetchone()[0]
+    return added, waiting
+
+LISTED_NOTE = "\n📋 Есть в списке класса"
+
+def register(conn, user_id: int, name: str, teacher_id: int, notice: str, approval_markup) -> bool:
+    # Новая заявка и уведомление учителю в outbox; True — имя есть в загруженном списке класса
+    conn.execute("INSERT OR REPLACE INTO users (user_id, name, role, approved) VALUES (?, ?, 'student', 0)", (user_id, name))
+    listed = conn.execute("SELECT 1 FROM expected_students WHERE name=?", (name,)).fetchone() is not None
+    outbox.enqueue(conn, teacher_id, notice + (LISTED_NOTE if listed else ""), priority=TEACHER,
+                   reply_markup=approval_markup)
+    return listed
+
+def forget(conn, name: str) -> int:
+    # Имя из списка, под которым ещё никто не зарегистрировался
+    return conn.execute("DELETE FROM expected_students WHERE name=?", (name,)).rowcount
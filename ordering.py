@@ -0,0 +1,55 @@
+# ordering.py
+import asyncio
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+
+# === ПОРЯДОК ОБРАБОТКИ ОБНОВЛЕНИЙ ===
+# Обновления разных пользователей обрабатываются параллельно,
+# а обновления одного пользователя — строго по очереди, в порядке прихода:
+# состояние FSM (например, Registration.awaiting_reason) не перемешивается.
+# Одновременно работает не больше workers обработчиков; если у пользователя
+# или у бота в целом накопилось слишком много ожидающих обновлений,
+# новые отбрасываются.
+
+class UserOrderMiddleware(BaseMiddleware):
+    def __init__(self, workers: int = 16, per_user: int = 20, total: int = 1000):
+        self.per_user = per_user
+        self.total = total
+        self._slots = asyncio.Semaphore(workers)
+        self._locks = {}     # user_id -> Lock (asyncio.Lock пропускает ждущих по порядку)
+        self._pending = {}   # user_id -> число обновлений в работе и в ожидании
+        self._waiting = 0
+        self.processed = 0
+        self.dropped = 0
+
+    def pending(self) -> int:
+        return self._waiting
+
+    async def __call__(self, handler, event: Update, data: dict):
+        user = data.get("event_from_user")
+        if user is None:
+            async with self._slots:
+                return await handler(event, data)
+        key = user.id
+        count = self._pending.get(key, 0)
+        if count >= self.per_user or self._waiting >= self.total:
+            self.dropped += 1
+            print(f"[Очередь] обновление {event.update_id} от {key} отброшено")
+            return None
+        self._pending[key] = count + 1
+        self._waiting += 1
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                async with self._slots:
+                    result = await handler(event, data)
+                    self.processed += 1
+                    return result
+        finally:
+            self._waiting -= 1
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+                del self._locks[key]
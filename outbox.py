@@ -0,0 +1,191 @@
+# outbox.py
+import asyncio
+import json
+import time
+import uuid
+
+from aiogram import types
+
+from sender import NORMAL, TEACHER
+
+
+# === ИСХОДЯЩИЙ ЯЩИК (OUTBOX) ===
+# Сообщения пишутся в таблицу outbox той же транзакцией, что и изменение
+# данных, поэтому не теряются при падении процесса между commit и отправкой.
+# Фоновый диспетчер разбирает ящик, повторяет неудачные отправки
+# с растущей паузой и после исчерпания попыток сообщает учителю.
+# Ключ (key) уникален: повторная постановка той же операции игнорируется.
+
+SEND = "send"            # обычное сообщение
+DUTY_POST = "duty_post"  # новый пост в канал; message_id сохраняется в duty_message
+DUTY_EDIT = "duty_edit"  # правка поста о дежурстве (или новый пост, если его нет и не задан edit_only)
+
+MAX_ATTEMPTS = 8
+BATCH = 100
+KEEP_SENT = 7 * 24 * 3600
+
+def enqueue(conn, chat_id, text: str, kind: str = SEND, key: str = None,
+            priority: int = NORMAL, parse_mode: str = None, reply_markup=None, failure_note: str = None,
+            edit_only: bool = False):
+    options = {}
+    if edit_only:
+        options["edit_only"] = True
+    if parse_mode:
+        options["parse_mode"] = parse_mode
+    if reply_markup is not None:
+        options["markup"] = {"type": type(reply_markup).__name__, "data": reply_markup.model_dump(exclude_none=True)}
+    if failure_note:
+        options["failure_note"] = failure_note
+    now = time.time()
+    conn.execute(
+        "INSERT OR IGNORE INTO outbox (key, kind, chat_id, text, options, priority, created_at, next_attempt_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (key or uuid.uuid4().hex, kind, str(chat_id), text, json.dumps(options, ensure_ascii=False), priority, now, now)
+    )
+
+# --- Пачки сообщений одной операции ---
+# Ключ «пачка:чат» позволяет следить за доставкой всей пачки по индексу key
+def batch_key(batch: str, chat_id) -> str:
+    return f"{batch}:{chat_id}"
+
+async def batch_progress(db, batch: str) -> dict:
+    # {статус: число сообщений}
+    rows = await db.fetchall(
+        "SELECT status, COUNT(*) FROM outbox WHERE key > ? AND key < ? GROUP BY status", (f"{batch}:", f"{batch};")
+    )
+    return dict(rows)
+
+def _chat(value: str):
+    return int(value) if value.lstrip("-").isdigit() else value
+
+def _markup(options: dict):
+    markup = options.get("markup")
+    if not markup:
+        return None
+    return getattr(types, markup["type"]).model_validate(markup["data"])
+
+
+class OutboxDispatcher:
+    # Строка, взятая в доставку, помечается status='sending' в той же
+    # транзакции, что и выборка: повторный разбор её не видит.
+    # wake(t) разбирает ящик только этого класса; раз в poll_interval
+    # просматриваются все классы (повторы после паузы).
+    def __init__(self, registry, sender, sync, poll_interval: float = 10):
+        self.registry = registry
+        self.sender = sender
+        self.sync = sync  # правки поста о дежурстве сливаются через MessageSync
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._dirty = set()  # классы, в ящике которых появились сообщения
+        self._in_flight = {}  # (класс, id строки) -> задача доставки
+        self.delivered = 0
+        self.failed = 0
+
+    def wake(self, t=None):
+        if t is None:
+            self._dirty.update(tenant.id for tenant in self.registry)
+        else:
+            self._dirty.add(t.id)
+        self._wakeup.set()
+
+    async def run(self):
+        # Строки, которые доставлялись при остановке процесса, возвращаются в очередь
+        for t in self.registry:
+            await t.db.execute("UPDATE outbox SET status='pending' WHERE status='sending'")
+        self.wake()
+        last_purge = 0.0
+        while True:
+            self._wakeup.clear()
+            dirty, self._dirty = self._dirty, set()
+            for tenant_id in dirty:
+                t = self.registry.get(tenant_id)
+                if t is not None and await self.drain(t) >= BATCH:
+                    self._dirty.add(tenant_id)  # в ящике может быть ещё — разбираем сразу
+            if time.time() - last_purge > 3600:
+                for t in self.registry:
+                    await t.db.execute(
+                        "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?", (time.time() - KEEP_SENT,)
+                    )
+                last_purge = time.time()
+            if self._dirty:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                self.wake()
+
+    async def drain(self, t) -> int:
+        rows = await t.db.transaction(_claim, time.time(), BATCH)
+        # Доставка идёт в фоне: медленная отправка или окно debounce
+        # не задерживают разбор следующих строк
+        for row in rows:
+            key = (t.id, row[0])
+            task = self._in_flight[key] = asyncio.create_task(self._deliver(t, *row))
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+        return len(rows)
+
+    async def _call(self, t, kind, chat_id, text, options, priority):
+        kwargs = {"priority": priority}
+        if options.get("parse_mode"):
+            kwargs["parse_mode"] = options["parse_mode"]
+        markup = _markup(options)
+        if markup is not None:
+            kwargs["reply_markup"] = markup
+        if kind == DUTY_EDIT:
+            row = await t.db.fetchone("SELECT message_id FROM duty_message WHERE id=1")
+            if row:
+                del kwargs["priority"]
+                await self.sync.set_text(chat_id, row[0], text, **kwargs)
+                return None
+            if options.get("edit_only"):
+                return None
+        result = await self.sender.send_message(chat_id, text, **kwargs)
+        if kind in (DUTY_POST, DUTY_EDIT):
+            self.sync.remember(chat_id, result.message_id, text)
+        return result
+
+    async def _deliver(self, t, outbox_id, kind, chat_id, text, options, priority, attempts):
+        options = json.loads(options or "{}")
+        try:
+            result = await self._call(t, kind, _chat(chat_id), text, options, priority)
+        except Exception as e:
+            await self._retry_or_fail(t, outbox_id, attempts + 1, options, e)
+            return
+        message_id = getattr(result, "message_id", None) if kind in (DUTY_POST, DUTY_EDIT) else None
+        await t.db.transaction(_mark_sent, outbox_id, message_id)
+        self.delivered += 1
+
+    async def _retry_or_fail(self, t, outbox_id, attempts, options, error):
+        if attempts < MAX_ATTEMPTS:
+            delay = min(2 ** attempts, 600)
+            await t.db.execute(
+                "UPDATE outbox SET status='pending', attempts=?, next_attempt_at=?, last_error=? WHERE id=?",
+                (attempts, time.time() + delay, str(error), outbox_id)
+            )
+            return
+        await t.db.execute(
+            "UPDATE outbox SET attempts=?, status='failed', last_error=? WHERE id=?",
+            (attempts, str(error), outbox_id)
+        )
+        self.failed += 1
+        note = options.get("failure_note")
+        if note:
+            try:
+                await self.sender.send_message(t.teacher_id, f"{note}: {error}", TEACHER)
+            except Exception as e:
+                print(f"[Ошибка] {e}")
+
+
+def _claim(conn, now: float, limit: int):
+    rows = conn.execute(
+        "SELECT id, kind, chat_id, text, options, priority, attempts FROM outbox "
+        "WHERE status='pending' AND next_attempt_at <= ? ORDER BY priority, id LIMIT ?",
+        (now, limit)
+    ).fetchall()
+    conn.executemany("UPDATE outbox SET status='sending' WHERE id=?", [(row[0],) for row in rows])
+    return rows
+
+def _mark_sent(conn, outbox_id: int, message_id: int = None):
+    conn.execute("UPDATE outbox SET status='sent' WHERE id=?", (outbox_id,))
+    if message_id is not None:
+        conn.execute("INSERT OR REPLACE INTO duty_message (id, message_id) VALUES (1, ?)", (message_id,))
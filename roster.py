@@ -0,0 +1,61 @@
+# roster.py
+from duty import DutyEntry
+
+
+# === ОЧЕРЕДЬ ДЕЖУРНЫХ ===
+# Каждое имя встречается в очереди один раз (name — первичный ключ),
+# порядок задаёт явная позиция с уникальным индексом. Хвост находится
+# по индексу, поэтому отправить дежурного в конец или
+# добавить новое имя стоит одинаково при 20 и при 2000 записях.
+# Функции с conn выполняются внутри db.transaction или db.run_sync.
+
+def names(conn) -> list:
+    return [row[0] for row in conn.execute("SELECT name FROM duty_roster ORDER BY position")]
+
+def entries(conn) -> list:
+    return [DutyEntry(*row) for row in conn.execute(
+        "SELECT name, position, served, last_served FROM duty_roster ORDER BY position"
+    )]
+
+def append(conn, name: str) -> bool:
+    # Добавляет имя в конец; если оно уже в очереди, ничего не меняет
+    return conn.execute(
+        "INSERT INTO duty_roster (name, position) "
+        "VALUES (?, COALESCE((SELECT MAX(position) FROM duty_roster), 0) + 1) "
+        "ON CONFLICT (name) DO NOTHING",
+        (name,)
+    ).rowcount > 0
+
+def move_to_end(conn, name: str):
+    # Добавляет имя в конец или переносит туда, если оно уже в очереди
+    conn.execute(
+        "INSERT INTO duty_roster (name, position) "
+        "VALUES (?, COALESCE((SELECT MAX(position) FROM duty_roster), 0) + 1) "
+        "ON CONFLICT (name) DO UPDATE SET position = excluded.position",
+        (name,)
+    )
+
+def record_duty(conn, name: str, date: str):
+    # Дежурный уходит в конец очереди, его счётчик и дата дежурства обновляются
+    conn.execute(
+        "UPDATE duty_roster SET served = served + 1, last_served = ?, "
+        "position = (SELECT MAX(position) FROM duty_roster) + 1 WHERE name = ?",
+        (date, name)
+    )
+
+def remove(conn, name: str) -> bool:
+    return conn.execute("DELETE FROM duty_roster WHERE name=?", (name,)).rowcount > 0
+
+def clear(conn):
+    conn.execute("DELETE FROM duty_roster")
+
+def resort(conn) -> list:
+    # Перестраивает очередь по алфавиту и начинает учёт дежурств заново.
+    # Новые позиции идут после старого максимума, чтобы не пересечься с ними.
+    top = conn.execute("SELECT COALESCE(MAX(position), 0) FROM duty_roster").fetchone()[0]
+    ordered = [row[0] for row in conn.execute("SELECT name FROM duty_roster ORDER BY name")]
+    conn.executemany(
+        "UPDATE duty_roster SET position = ?, served = 0, last_served = NULL WHERE name = ?",
+        [(top + i, name) for i, name in enumerate(ordered, start=1)]
+    )
+    return ordered
@@ -0,0 +1,107 @@
+# scheduler.py
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta, timezone
+
+
+# === ПЛАНИРОВЩИК ЗАДАЧ ===
+# Задачи лежат в куче по ближайшему сроку запуска (UTC).
+# Цикл спит ровно до первого срока, а не просыпается каждые 10 секунд.
+# Время последнего запуска сохраняется через store, поэтому после
+# перезапуска пропущенный запуск выполняется (если не истёк grace),
+# а уже выполненный — не повторяется. Догоняется только срок после
+# записанного запуска: новая задача ждёт своего ближайшего срока.
+
+class DailyJob:
+    def __init__(self, name: str, func, hour: int, minute: int = 0,
+                 tz_offset: int = 0, grace: timedelta = timedelta(hours=2)):
+        self.name = name
+        self.func = func  # async-функция без аргументов
+        self.hour = hour
+        self.minute = minute
+        self.tz = timezone(timedelta(hours=tz_offset))
+        self.grace = grace
+
+    def deadline_on(self, day) -> datetime:
+        local = datetime(day.year, day.month, day.day, self.hour, self.minute, tzinfo=self.tz)
+        return local.astimezone(timezone.utc)
+
+    def previous_deadline(self, now: datetime) -> datetime:
+        today = now.astimezone(self.tz).date()
+        deadline = self.deadline_on(today)
+        return deadline if deadline <= now else self.deadline_on(today - timedelta(days=1))
+
+    def next_deadline(self, after: datetime) -> datetime:
+        today = after.astimezone(self.tz).date()
+        deadline = self.deadline_on(today)
+        return deadline if deadline > after else self.deadline_on(today + timedelta(days=1))
+
+
+class Scheduler:
+    def __init__(self, store, clock=None):
+        # store: async get(name) -> datetime | None и async set(name, datetime)
+        self.store = store
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self.lag = {}  # имя задачи -> опоздание последнего запуска, секунды
+        self._running = set()
+
+    async def add(self, job: DailyJob):
+        now = self.clock()
+        last_run = await self.store.get(job.name)
+        missed = job.previous_deadline(now)
+        if last_run is None:
+            # Новая задача (первая установка, новый класс): прошедший срок
+            # не считается пропущенным, отсчёт ведётся с него
+            await self.store.set(job.name, missed)
+            deadline = job.next_deadline(now)
+        elif last_run < missed and now - missed <= job.grace:
+            deadline = missed  # догоняем пропущенный запуск
+        else:
+            deadline = job.next_deadline(now)
+        heapq.heappush(self._heap, (deadline, next(self._seq), job))
+        self._wakeup.set()
+
+    async def _sleep_until(self, deadline: datetime):
+        while True:
+            delay = (deadline - self.clock()).total_seconds()
+            if delay <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            if self._heap and self._heap[0][0] < deadline:
+                return  # появилась задача с более ранним сроком
+
+    async def _fire(self, deadline: datetime, job: DailyJob):
+        last_run = await self.store.get(job.name)
+        if last_run is not None and last_run >= deadline:
+            return
+        # Отмечаем запуск до выполнения: задача не сработает дважды
+        await self.store.set(job.name, deadline)
+        self.lag[job.name] = (self.clock() - deadline).total_seconds()
+        try:
+            await job.func()
+        except Exception as e:
+            print(f"[Планировщик] {job.name}: {e}")
+
+    async def run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            deadline = self._heap[0][0]
+            await self._sleep_until(deadline)
+            if self._heap[0][0] < deadline:
+                continue
+            deadline, _, job = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._fire(deadline, job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            heapq.heappush(self._heap, (job.next_deadline(deadline), next(self._seq), job))
@@ -0,0 +1,246 @@
+# schema.py
+import ast
+import os
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+
+
+# === СХЕМА БАЗЫ С ВЕРСИЯМИ ===
+# Номер применённой миграции хранится в PRAGMA user_version.
+# Новая миграция добавляется в конец списка и никогда не меняется задним числом.
+
+MIGRATIONS = [
+    # 1 — исходные таблицы
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        name TEXT,
+        role TEXT,
+        approved INTEGER DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS duty_roster (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS duty_message (
+        id INTEGER PRIMARY KEY,
+        message_id INTEGER
+    );
+
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS attendance (
+        user_id INTEGER,
+        date TEXT,
+        status TEXT,
+        reason TEXT,
+        PRIMARY KEY (user_id, date)
+    );
+
+    CREATE TABLE IF NOT EXISTS absences (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT,
+        reason TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_absences_user ON absences (user_id, start_date);
+    ''',
+    # 2 — индексы для горячих запросов
+    '''
+    CREATE INDEX IF NOT EXISTS idx_users_name ON users (name);
+    CREATE INDEX IF NOT EXISTS idx_users_role_approved ON users (role, approved);
+    CREATE INDEX IF NOT EXISTS idx_attendance_date_status ON attendance (date, status);
+    CREATE INDEX IF NOT EXISTS idx_absences_start ON absences (start_date);
+    CREATE INDEX IF NOT EXISTS idx_duty_roster_name ON duty_roster (name);
+    ''',
+    # 3 — исходящий ящик сообщений
+    '''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT NOT NULL UNIQUE,
+        kind TEXT NOT NULL,
+        chat_id TEXT NOT NULL,
+        text TEXT NOT NULL,
+        options TEXT,
+        priority INTEGER NOT NULL DEFAULT 1,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        next_attempt_at REAL NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+    CREATE INDEX IF NOT EXISTS idx_outbox_created ON outbox (status, created_at);
+    ''',
+    # 4 — очередь дежурных: уникальные имена и явные позиции
+    # (из повторов остаётся первое вхождение)
+    '''
+    CREATE TABLE duty_queue (
+        name TEXT PRIMARY KEY,
+        position REAL NOT NULL
+    );
+
+    INSERT INTO duty_queue (name, position)
+        SELECT name, MIN(id) FROM duty_roster GROUP BY name;
+
+    DROP TABLE duty_roster;
+    ALTER TABLE duty_queue RENAME TO duty_roster;
+
+    CREATE UNIQUE INDEX idx_duty_roster_position ON duty_roster (position);
+    ''',
+    # 5 — число дежурств и дата последнего дежурства
+    '''
+    ALTER TABLE duty_roster ADD COLUMN served INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE duty_roster ADD COLUMN last_served TEXT;
+    ''',
+    # 6 — архив посещаемости закрытых месяцев
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_archive (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        present INTEGER NOT NULL,
+        PRIMARY KEY (user_id, month)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS attendance_archive_reasons (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        reason TEXT,
+        PRIMARY KEY (user_id, date)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_attendance_archive_month ON attendance_archive (month);
+    CREATE INDEX IF NOT EXISTS idx_attendance_archive_reasons_date ON attendance_archive_reasons (date);
+    CREATE INDEX IF NOT EXISTS idx_absences_end ON absences (end_date);
+    ''',
+    # 7 — список класса, загруженный учителем (/import)
+    '''
+    CREATE TABLE IF NOT EXISTS expected_students (
+        name TEXT PRIMARY KEY
+    ) WITHOUT ROWID;
+    ''',
+    # 8 — причины отсутствия в архиве хранятся диапазонами внутри месяца
+    '''
+    CREATE TABLE attendance_archive_absences (
+        user_id INTEGER NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        reason TEXT,
+        PRIMARY KEY (user_id, start_date)
+    ) WITHOUT ROWID;
+
+    INSERT INTO attendance_archive_absences (user_id, start_date, end_date, reason)
+        SELECT user_id, date, date, reason FROM attendance_archive_reasons;
+
+    DROP TABLE attendance_archive_reasons;
+
+    CREATE INDEX idx_attendance_archive_absences_start ON attendance_archive_absences (start_date);
+    ''',
+    # 9 — имена из списка класса больше не встают в очередь дежурных до приёма:
+    # убираем тех, кто так и не зарегистрировался
+    '''
+    DELETE FROM duty_roster
+        WHERE name IN (SELECT name FROM expected_students)
+        AND name NOT IN (SELECT name FROM users WHERE role = 'student' AND approved = 1);
+    ''',
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Состояния FSM живут в отдельной базе (fsmstore.py): пользователь ещё
+# не привязан к классу, когда начинает регистрацию
+FSM_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fsm_state (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    scope TEXT NOT NULL,
+    state TEXT,
+    data TEXT,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, user_id, scope)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state (updated_at);
+'''
+
+def apply_migrations(conn):
+    # Миграция и новый номер версии фиксируются одной транзакцией:
+    # после сбоя посередине миграция целиком повторяется при следующем запуске
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+    return SCHEMA_VERSION
+
+def migrate(db):
+    return db.run_sync(apply_migrations)
+
+
+# === ПРОВЕРКА ПЛАНОВ ЗАПРОСОВ ===
+# Собирает все SQL-строки из модулей бота и прогоняет EXPLAIN QUERY PLAN
+# на пустой базе с актуальной схемой. Полный просмотр таблицы допустим
+# только для запросов без WHERE (осознанное чтение всей таблицы).
+# Запуск: python schema.py (или python -m pytest, см. test_schema.py)
+
+SQL_START = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?! USING (?:COVERING )?INDEX)")
+
+def collect_queries(paths):
+    queries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and SQL_START.match(node.value):
+                # шаблоны вида {where} проверяем в базовом варианте
+                sql = node.value.format_map(defaultdict(str)) if "{" in node.value else node.value
+                queries.append((f"{os.path.basename(path)}:{node.lineno}", sql))
+    return queries
+
+def full_scans(conn, sql: str):
+    params = [None] * sql.count("?")
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [detail for *_, detail in plan if FULL_SCAN.match(detail)]
+
+def check_query_plans(paths):
+    conn = sqlite3.connect(":memory:")
+    apply_migrations(conn)
+    conn.executescript(FSM_SCHEMA)
+    failures = []
+    for where, sql in collect_queries(paths):
+        if not re.search(r"\bWHERE\b", sql, re.IGNORECASE):
+            continue
+        scans = full_scans(conn, sql)
+        if scans:
+            failures.append((where, " ".join(sql.split()), scans))
+    conn.close()
+    return failures
+
+def bot_modules():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return sorted(
+        os.path.join(here, name) for name in os.listdir(here)
+        if name.endswith(".py") and name != "config.py" and not name.startswith("test_")
+    )
+
+
+if __name__ == "__main__":
+    failures = check_query_plans(bot_modules())
+    for where, sql, scans in failures:
+        print(f"❌ {where}: {'; '.join(scans)}\n   {sql}")
+    print("✅ Полных просмотров таблиц нет." if not failures else f"Найдено: {len(failures)}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,145 @@
+# sender.py
+import asyncio
+import itertools
+import time
+from functools import partial
+
+from aiogram.exceptions import TelegramRetryAfter
+
+
+# === ОЧЕРЕДЬ ИСХОДЯЩИХ СООБЩЕНИЙ ===
+# Все отправки и редактирования идут через одну очередь с приоритетами:
+# сначала сообщения учителю, затем обычные, рассылки — последними.
+# Лимиты Telegram соблюдаются корзинами токенов: общая на бота
+# и отдельная на каждый чат. Ответ 429 (retry_after) откладывает
+# только этот чат, остальные сообщения продолжают уходить.
+
+TEACHER = 0
+NORMAL = 1
+BROADCAST = 2
+
+GLOBAL_RATE = 30          # сообщений в секунду на бота
+PRIVATE_RATE = 1          # сообщений в секунду в личный чат
+GROUP_RATE = 20 / 60      # сообщений в секунду в группу или канал
+MAX_RETRIES = 5
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        # Сколько ждать до следующего токена (0 — можно отправлять сейчас)
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _is_group(chat_id) -> bool:
+    return isinstance(chat_id, str) or chat_id < 0
+
+
+class SendQueue:
+    def __init__(self, bot, workers: int = 4):
+        self.bot = bot
+        self.workers = workers
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats = {}
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = GROUP_RATE if _is_group(chat_id) else PRIVATE_RATE
+            bucket = self._chats[chat_id] = TokenBucket(rate, max(1.0, rate * 3))
+        return bucket
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # --- Постановка в очередь ---
+    def submit(self, chat_id, call, priority: int = NORMAL) -> asyncio.Future:
+        # call — функция без аргументов, возвращающая корутину запроса к API
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._seq), chat_id, call, future, 0))
+        return future
+
+    def send_message(self, chat_id, text: str, priority: int = NORMAL, **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, partial(self.bot.send_message, chat_id, text, **kwargs), priority)
+
+    def edit_message_text(self, text: str, chat_id, message_id: int, priority: int = NORMAL, **kwargs) -> asyncio.Future:
+        call = partial(self.bot.edit_message_text, text=text, chat_id=chat_id, message_id=message_id, **kwargs)
+        return self.submit(chat_id, call, priority)
+
+    # --- Обработка ---
+    def _requeue(self, entry, delay: float):
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, self._queue.put_nowait, entry)
+
+    async def _worker(self):
+        while True:
+            entry = await self._queue.get()
+            priority, seq, chat_id, call, future, attempt = entry
+            if future.done():
+                continue
+            now = time.monotonic()
+            chat_wait = self._bucket(chat_id).delay(now)
+            if chat_wait > 0:
+                self._requeue(entry, chat_wait)
+                continue
+            global_wait = self._global.delay(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                now = time.monotonic()
+            self._global.take(now)
+            self._bucket(chat_id).take(now)
+            try:
+                result = await call()
+            except TelegramRetryAfter as e:
+                self._bucket(chat_id).block(e.retry_after)
+                if attempt + 1 >= MAX_RETRIES:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.retried += 1
+                    self._requeue((priority, seq, chat_id, call, future, attempt + 1), e.retry_after)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.sent += 1
+                if not future.done():
+                    future.set_result(result)
+
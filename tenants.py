@@ -0,0 +1,167 @@
+# tenants.py
+import os
+from contextvars import ContextVar
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+import schema
+from cache import RenderCache
+from db import Database, Executors
+from directory import UserDirectory
+from workdays import Calendar, from_config
+
+
+# === КЛАССЫ (ТЕНАНТЫ) ===
+# Один процесс обслуживает много классов. У каждого класса свой учитель,
+# канал, часовой пояс и своя база (шард) с учениками и посещаемостью.
+# Текущий класс хранится в contextvar и выставляется middleware
+# для каждого входящего обновления или задачей планировщика.
+
+DEFAULT_TENANT = "default"
+DATA_DIR = "data"
+# Базы всех классов обслуживаются общими потоками (см. db.Executors);
+# кэш страниц SQLite у соединения шарда ограничен, чтобы сотни классов
+# не держали по несколько мегабайт каждый
+SHARD_WRITERS = 2
+SHARD_READERS = 4
+SHARD_CACHE_KIB = 512
+
+class Tenant:
+    def __init__(self, tenant_id: str, teacher_id: int, channel_id: str,
+                 timezone_offset: int = 0, db_path: str = None, calendar: Calendar = None):
+        self.id = tenant_id
+        self.teacher_id = teacher_id
+        self.channel_id = channel_id
+        self.calendar = calendar or Calendar(timezone_offset)
+        self.db_path = db_path or os.path.join(DATA_DIR, f"{tenant_id}.db")
+        self.db = None
+        self.reports = RenderCache()
+        self.users = UserDirectory()
+        self.active = True
+        self.channel = channel_id
+
+    def open(self, executors: Executors = None):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = Database(self.db_path, readers=1, executors=executors, cache_kib=SHARD_CACHE_KIB)
+        schema.migrate(self.db)
+        self.db.run_sync(lambda c: c.execute(
+            "INSERT OR IGNORE INTO settings (key, value) VALUES ('channel', ?)", (self.channel_id,)
+        ))
+        row = self.db.run_sync(lambda c: c.execute("SELECT value FROM settings WHERE key='channel'").fetchone())
+        self.channel = row[0] if row else self.channel_id
+        self.users.load(self.db.run_sync(lambda c: c.execute("SELECT user_id, name, role, approved FROM users").fetchall()))
+        return self
+
+    def is_teacher(self, user_id: int) -> bool:
+        return user_id == self.teacher_id
+
+    def close(self):
+        if self.db:
+            self.db.close()
+
+
+class TenantRegistry:
+    def __init__(self):
+        self._by_id = {}
+        self._by_teacher = {}
+        self._members = {}  # user_id -> tenant_id
+        self.executors = Executors(SHARD_WRITERS, SHARD_READERS)
+
+    def add(self, tenant: Tenant):
+        self._by_id[tenant.id] = tenant
+        self._by_teacher.setdefault(tenant.teacher_id, tenant)
+
+    def get(self, tenant_id: str):
+        return self._by_id.get(tenant_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def open_all(self):
+        for tenant in self:
+            tenant.open(self.executors)
+            for record in tenant.users:
+                self._members.setdefault(record.user_id, tenant.id)
+
+    def close_all(self):
+        for tenant in self:
+            tenant.close()
+        self.executors.shutdown()
+
+    def bind(self, user_id: int, tenant: Tenant):
+        self._members[user_id] = tenant.id
+
+    def unbind(self, user_id: int):
+        self._members.pop(user_id, None)
+
+    def resolve(self, user_id: int, start_arg: str = None):
+        tenant = self._by_teacher.get(user_id)
+        if tenant:
+            return tenant
+        tenant_id = self._members.get(user_id)
+        if tenant_id:
+            return self._by_id[tenant_id]
+        if start_arg and start_arg in self._by_id:
+            return self._by_id[start_arg]
+        if len(self._by_id) == 1:
+            return next(iter(self._by_id.values()))
+        return None
+
+def load_tenants(config) -> TenantRegistry:
+    # Без TENANTS в config.py работает как раньше: один класс и school_bot.db
+    registry = TenantRegistry()
+    entries = getattr(config, "TENANTS", None)
+    if not entries:
+        registry.add(Tenant(DEFAULT_TENANT, config.TEACHER_ID, config.CHANNEL_ID,
+                            config.TEACHER_TIMEZONE_OFFSET, "school_bot.db",
+                            from_config(config, config.TEACHER_TIMEZONE_OFFSET)))
+        return registry
+    for entry in entries:
+        offset = entry.get("timezone_offset", 0)
+        registry.add(Tenant(str(entry["id"]), entry["teacher_id"], entry["channel_id"],
+                            offset, entry.get("db"), from_config(config, offset, entry)))
+    return registry
+
+
+# === ТЕКУЩИЙ КЛАСС ===
+current_tenant: ContextVar[Tenant] = ContextVar("current_tenant")
+
+def tenant() -> Tenant:
+    return current_tenant.get()
+
+def use(t: Tenant):
+    return current_tenant.set(t)
+
+
+def _start_arg(update: Update):
+    text = update.message.text if update.message and update.message.text else ""
+    parts = text.split(maxsplit=1)
+    if len(parts) == 2 and parts[0].split("@")[0] == "/start":
+        return parts[1].strip()
+    return None
+
+class TenantMiddleware(BaseMiddleware):
+    def __init__(self, registry: TenantRegistry):
+        self.registry = registry
+
+    async def __call__(self, handler, event: Update, data: dict):
+        user = data.get("event_from_user")
+        if user is None:
+            return None
+        t = self.registry.resolve(user.id, _start_arg(event))
+        if t is None:
+            if event.message:
+                await event.message.answer("🔗 Попросите у классного руководителя ссылку для регистрации.")
+            return None
+        token = use(t)
+        data["tenant"] = t
+        try:
+            return await handler(event, data)
+        finally:
+            current_tenant.reset(token)
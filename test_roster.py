@@ -0,0 +1,50 @@
+# test_roster.py
+import sqlite3
+
+import pytest
+
+import roster
+import schema
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    schema.apply_migrations(conn)
+    return conn
+
+def test_append_keeps_names_unique(conn):
+    assert roster.append(conn, "Иван Иванов")
+    assert roster.append(conn, "Анна Петрова")
+    assert not roster.append(conn, "Иван Иванов")
+    assert roster.names(conn) == ["Иван Иванов", "Анна Петрова"]
+
+def test_move_to_end(conn):
+    for name in ("Анна Петрова", "Иван Иванов", "Олег Смирнов"):
+        roster.append(conn, name)
+    roster.move_to_end(conn, "Анна Петрова")
+    roster.move_to_end(conn, "Мария Козлова")  # нового — в хвост
+    assert roster.names(conn) == ["Иван Иванов", "Олег Смирнов", "Анна Петрова", "Мария Козлова"]
+
+def test_record_duty_moves_to_end_and_counts(conn):
+    for name in ("Анна Петрова", "Иван Иванов"):
+        roster.append(conn, name)
+    roster.record_duty(conn, "Анна Петрова", "2026-10-16")
+    roster.record_duty(conn, "Иван Иванов", "2026-10-19")
+    roster.record_duty(conn, "Анна Петрова", "2026-10-20")
+    entries = {entry.name: entry for entry in roster.entries(conn)}
+    assert roster.names(conn) == ["Иван Иванов", "Анна Петрова"]
+    assert (entries["Анна Петрова"].served, entries["Анна Петрова"].last_served) == (2, "2026-10-20")
+    assert (entries["Иван Иванов"].served, entries["Иван Иванов"].last_served) == (1, "2026-10-19")
+
+def test_resort_orders_by_name_and_resets_counts(conn):
+    for name in ("Олег Смирнов", "Анна Петрова", "Иван Иванов"):
+        roster.append(conn, name)
+    roster.record_duty(conn, "Анна Петрова", "2026-10-16")
+    # повторная сортировка не упирается в уникальный индекс позиций
+    assert roster.resort(conn) == ["Анна Петрова", "Иван Иванов", "Олег Смирнов"]
+    assert roster.resort(conn) == ["Анна Петрова", "Иван Иванов", "Олег Смирнов"]
+    assert roster.names(conn) == ["Анна Петрова", "Иван Иванов", "Олег Смирнов"]
+    assert {(entry.served, entry.last_served) for entry in roster.entries(conn)} == {(0, None)}
+    positions = [entry.position for entry in roster.entries(conn)]
+    assert len(set(positions)) == len(positions)
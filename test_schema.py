@@ -0,0 +1,40 @@
+# test_schema.py
+import sqlite3
+
+import pytest
+
+import schema
+
+
+def test_no_full_table_scans():
+    failures = schema.check_query_plans(schema.bot_modules())
+    assert failures == [], "\n".join(f"{where}: {'; '.join(scans)}\n   {sql}" for where, sql, scans in failures)
+
+def test_migrations_reach_current_version():
+    conn = sqlite3.connect(":memory:")
+    assert schema.apply_migrations(conn) == schema.SCHEMA_VERSION
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == schema.SCHEMA_VERSION
+    # повторный запуск ничего не делает
+    schema.apply_migrations(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == schema.SCHEMA_VERSION
+
+def test_failed_migration_is_rolled_back(monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    migrations = schema.MIGRATIONS
+    monkeypatch.setattr(schema, "MIGRATIONS", migrations[:3])
+    schema.apply_migrations(conn)
+    conn.execute("INSERT INTO duty_roster (name) VALUES ('Анна Петрова')")
+    conn.commit()
+
+    # сбой в конце миграции 4: пересоздание очереди дежурных не должно остаться наполовину
+    broken = migrations[3] + "\nSELECT * FROM no_such_table;"
+    monkeypatch.setattr(schema, "MIGRATIONS", migrations[:3] + [broken])
+    with pytest.raises(sqlite3.OperationalError):
+        schema.apply_migrations(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert conn.execute("SELECT id, name FROM duty_roster").fetchall() == [(1, "Анна Петрова")]
+
+    monkeypatch.undo()
+    schema.apply_migrations(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == schema.SCHEMA_VERSION
+    assert conn.execute("SELECT name, position FROM duty_roster").fetchall() == [("Анна Петрова", 1.0)]
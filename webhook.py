@@ -0,0 +1,120 @@
+# webhook.py
+import asyncio
+import hmac
+import json
+import re
+import sys
+
+from aiohttp import ClientSession, web
+from aiogram.types import Update
+
+
+# === ПРИЁМ ОБНОВЛЕНИЙ ЧЕРЕЗ WEBHOOK ===
+# Встроенный HTTP-сервер принимает обновления от Telegram и кладёт их
+# в ограниченную очередь; разборщик передаёт их в тот же dp отдельными
+# задачами (не больше concurrency одновременно), а порядок обработки
+# для каждого пользователя соблюдает UserOrderMiddleware.
+# Запрос без верного секрета отклоняется (401). Если очередь заполнена,
+# сервер отвечает 503 с Retry-After, и Telegram повторит доставку позже.
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Telegram принимает secret_token только из этих символов
+SECRET_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+def check_secret(secret: str):
+    # Без секрета кто угодно с доступом к порту мог бы слать поддельные обновления
+    if not isinstance(secret, str) or not SECRET_PATTERN.fullmatch(secret):
+        raise ValueError("WEBHOOK_SECRET обязателен: 1–256 символов A-Z, a-z, 0-9, _ и -")
+
+class WebhookServer:
+    def __init__(self, dp, bot, secret: str, path: str = "/webhook",
+                 queue_size: int = 1000, concurrency: int = 100):
+        self.dp = dp
+        self.bot = bot
+        check_secret(secret)
+        self.secret = secret.encode()
+        self.path = path
+        self._slots = asyncio.Semaphore(concurrency)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.accepted = 0
+        self.rejected = 0
+        self.dropped = 0
+        self._runner = None
+        self._reader = None
+        self._tasks = set()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "").encode("utf-8", "replace")
+        if not hmac.compare_digest(token, self.secret):
+            self.rejected += 1
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        self.accepted += 1
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            print(f"[Ошибка webhook] {e}")
+        finally:
+            self._slots.release()
+            self.queue.task_done()
+
+    async def _read(self):
+        while True:
+            await self._slots.acquire()
+            update = await self.queue.get()
+            task = asyncio.create_task(self._process(update))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def start(self, host: str, port: int):
+        self._reader = asyncio.create_task(self._read())
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+        await self.queue.join()
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+
+# === Повтор записанных обновлений ===
+# python webhook.py updates.jsonl http://127.0.0.1:8080/webhook SECRET
+# Каждая строка файла — JSON одного обновления Telegram.
+
+async def replay(path: str, url: str, secret: str):
+    statuses = {}
+    async with ClientSession() as session:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                async with session.post(url, json=json.loads(line), headers={SECRET_HEADER: secret}) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+    return statuses
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Использование: python webhook.py updates.jsonl URL SECRET")
+        sys.exit(2)
+    print(asyncio.run(replay(*sys.argv[1:])))
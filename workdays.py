@@ -0,0 +1,93 @@
+# workdays.py
+import calendar
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+
+# === УЧЕБНЫЙ КАЛЕНДАРЬ КЛАССА ===
+# «Сегодня» считается в часовом поясе учителя, а не сервера.
+# Рабочие дни — будни без праздников и каникул из config.py.
+# Списки дней месяца строятся один раз и дальше берутся из памяти.
+
+def _next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12}-{number % 12 + 1:02d}"
+
+class Calendar:
+    def __init__(self, tz_offset: int = 0, holidays=(), vacations=(), weekend=(5, 6)):
+        self.tz_offset = tz_offset
+        self.tz = timezone(timedelta(hours=tz_offset))
+        self.holidays = set(holidays)            # {"YYYY-MM-DD"}
+        self.vacations = sorted(vacations)       # [("YYYY-MM-DD", "YYYY-MM-DD")] включительно
+        self.weekend = set(weekend)
+        self._months = {}                        # "YYYY-MM" -> (все дни, рабочие дни)
+
+    # --- Сегодня ---
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def today(self) -> str:
+        return self.now().strftime("%Y-%m-%d")
+
+    # --- Месяцы ---
+    def _month(self, month: str):
+        cached = self._months.get(month)
+        if cached is None:
+            year, number = int(month[:4]), int(month[5:7])
+            days = tuple(f"{month}-{day:02d}" for day in range(1, calendar.monthrange(year, number)[1] + 1))
+            working = tuple(date for date in days if self._working(date))
+            cached = self._months[month] = (days, working)
+        return cached
+
+    def _working(self, date: str) -> bool:
+        if date in self.holidays:
+            return False
+        if any(start <= date <= end for start, end in self.vacations):
+            return False
+        return calendar.weekday(int(date[:4]), int(date[5:7]), int(date[8:10])) not in self.weekend
+
+    def month_days(self, month: str) -> tuple:
+        return self._month(month)[0]
+
+    def month_working_days(self, month: str) -> tuple:
+        return self._month(month)[1]
+
+    def is_working_day(self, date: str) -> bool:
+        working = self.month_working_days(date[:7])
+        i = bisect_left(working, date)
+        return i < len(working) and working[i] == date
+
+    # --- Диапазоны ---
+    def working_days(self, first: str, last: str) -> list:
+        # Рабочие дни с first по last включительно
+        result = []
+        month = first[:7]
+        while month <= last[:7]:
+            working = self.month_working_days(month)
+            result.extend(working[bisect_left(working, first):bisect_right(working, last)])
+            month = _next_month(month)
+        return result
+
+    def next_working_days(self, start: str, count: int, horizon: int = 366) -> list:
+        # Ближайшие count рабочих дней, начиная с start (включительно)
+        last = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=horizon)).strftime("%Y-%m-%d")
+        result = []
+        month = start[:7]
+        while len(result) < count and month <= last[:7]:
+            working = self.month_working_days(month)
+            result.extend(working[bisect_left(working, start):])
+            month = _next_month(month)
+        return result[:count]
+
+    def term_start(self, date: str) -> str:
+        # Учебный год начинается 1 сентября
+        year = int(date[:4]) if int(date[5:7]) >= 9 else int(date[:4]) - 1
+        return f"{year}-09-01"
+
+
+def from_config(config, tz_offset: int, entry: dict = None) -> Calendar:
+    # Праздники и каникулы: общие из config.py плюс свои у класса
+    entry = entry or {}
+    holidays = list(getattr(config, "HOLIDAYS", [])) + list(entry.get("holidays", []))
+    vacations = list(getattr(config, "VACATIONS", [])) + list(entry.get("vacations", []))
+    return Calendar(tz_offset, holidays, [tuple(v) for v in vacations])